@@ -2,64 +2,103 @@
 Migration tool for Home Assistant Lovelace UI.
 """
 import argparse
+import codecs
+import glob
+import hashlib
+import io
 import logging
 import sys
 import json
 import os
+import re
 import shutil
+import threading
+import time
 
 from collections import OrderedDict
+from collections.abc import ItemsView, Mapping
+from contextvars import ContextVar
+from copy import deepcopy
+from functools import lru_cache
 from getpass import getpass
 
-import requests
-import yaml
-
 _LOGGER = logging.getLogger(__name__)
 
+# Conversion cache of the `Lovelace` object currently being built
+_CONVERSION_CACHE = ContextVar('conversion_cache', default=None)
+
+
+def build_parser():
+    """Build the command line arguments parser."""
+    # Build arguments parser (argdown needs this at the beginning of the file)
+    parser = argparse.ArgumentParser(
+        description="Home Assistant Lovelace migration tool")
+
+    # Positional arguments
+    parser.add_argument(
+        'input', metavar='<api-url|file>', nargs='?',
+        help="Home Assistant REST API URL or states JSON file")
+
+    # Optional arguments
+    parser.add_argument(
+        '-o', '--output', metavar='<file>',
+        help="write output to <file> (default: ui-lovelace.<format>)")
+    parser.add_argument(
+        '-f', '--format', choices=Lovelace.DUMP_FORMATS, default='yaml',
+        help="output format (default: yaml)")
+    parser.add_argument(
+        '-p', '--password', metavar='<password>', nargs='?',
+        default=False, const=None,
+        help="Home Assistant API password")
+    parser.add_argument(
+        '-t', '--title', metavar='<title>', default='Home',
+        help="title of the Lovelace UI (default: Home)")
+    parser.add_argument(
+        '--debug', action='store_true',
+        help="set log level to DEBUG")
+    parser.add_argument(
+        '--dry-run', action='store_true',
+        help="do not write to output file")
+    parser.add_argument(
+        '--if-changed', action='store_true',
+        help="skip conversion if the output was generated from the same "
+             "states (yaml only)")
+    parser.add_argument(
+        '--batch', metavar='<manifest>',
+        help="convert every job in the JSON manifest <manifest>")
+    parser.add_argument(
+        '-j', '--jobs', metavar='<n>', type=int, default=os.cpu_count(),
+        help="number of batch worker processes (default: CPU count)")
+
+    return parser
+
+
+def parse_args(argv=None):
+    """Parse command line arguments and fill in input defaults."""
+    args = build_parser().parse_args(argv)
+
+    # Input was not provided, so we need to check a few other things (batch
+    # jobs take their inputs from the manifest instead)
+    if args.input is None and args.batch is None:
+        if args.password:
+            # User expects a password prompt
+            args.input = args.password
+            args.password = None
+        elif os.getenv('HASSIO_TOKEN') is not None:
+            # Script is running in Hass.io environment
+            args.input = 'http://hassio/homeassistant/api'
+            args.password = os.getenv('HASSIO_TOKEN')
+        else:
+            # Other defaults were not found
+            args.input = 'http://localhost:8123/api'
 
-# Build arguments parser (argdown needs this at the beginning of the file)
-parser = argparse.ArgumentParser(
-    description="Home Assistant Lovelace migration tool")
-
-# Positional arguments
-parser.add_argument(
-    'input', metavar='<api-url|file>', nargs='?',
-    help="Home Assistant REST API URL or states JSON file")
-
-# Optional arguments
-parser.add_argument(
-    '-o', '--output', metavar='<file>', default='ui-lovelace.yaml',
-    help="write output to <file> (default: ui-lovelace.yaml)")
-parser.add_argument(
-    '-p', '--password', metavar='<password>', nargs='?',
-    default=False, const=None,
-    help="Home Assistant API password")
-parser.add_argument(
-    '-t', '--title', metavar='<title>', default='Home',
-    help="title of the Lovelace UI (default: Home)")
-parser.add_argument(
-    '--debug', action='store_true',
-    help="set log level to DEBUG")
-parser.add_argument(
-    '--dry-run', action='store_true',
-    help="do not write to output file")
-
-# Parse the args
-args = parser.parse_args()
-
-# Input was not provided, so we need to check a few other things
-if args.input is None:
-    if args.password:
-        # User expects a password prompt
-        args.input = args.password
-        args.password = None
-    elif os.getenv('HASSIO_TOKEN') is not None:
-        # Script is running in Hass.io environment
-        args.input = 'http://hassio/homeassistant/api'
-        args.password = os.getenv('HASSIO_TOKEN')
-    else:
-        # Other defaults were not found
-        args.input = 'http://localhost:8123/api'
+    if args.output is None:
+        args.output = 'ui-lovelace.' + args.format
+
+    if args.if_changed and args.format != 'yaml':
+        build_parser().error("--if-changed requires --format yaml")
+
+    return args
 
 
 def dd(msg=None, j=None, *args):
@@ -72,15 +111,82 @@ def dd(msg=None, j=None, *args):
         _LOGGER.debug(msg.format(*args))
 
 
+def compile_key_order(key_order, delim='...'):
+    """
+    Compile `key_order` into a rank table.
+
+    Keys listed before `delim` get negative ranks, keys listed after it get
+    positive ranks and unlisted keys rank 0, so a stable sort by rank puts
+    the keys in the order described by `key_order`.
+    """
+    if key_order is None:
+        return None
+    return _compile_key_order(tuple(key_order), delim)
+
+
+@lru_cache(maxsize=None)
+def _compile_key_order(key_order, delim):
+    """Build (and share) the rank table for a `key_order` tuple."""
+    if delim in key_order:
+        mid = key_order.index(delim)
+    else:
+        mid = len(key_order)
+
+    ranks = {}
+    for i, key in enumerate(key_order):
+        if i != mid:
+            ranks.setdefault(key, i - mid)
+    return ranks
+
+
+def reads(*attributes):
+    """
+    Declare the entity attributes a `from_xxx_config` converter reads.
+
+    Used to decide which attributes to keep when ingesting states (see
+    `Lovelace.state_attributes`).
+    """
+    def decorator(fx):
+        fx.attributes = frozenset(attributes)
+        return fx
+    return decorator
+
+
 class LovelaceBase(OrderedDict):
     """
     Base class for Lovelace objects.
 
-    Derivitives should set `key_order`:
+    Derivitives should set `key_order` on the class:
+
+    key_order = ['first', 'second', '...', 'last']
 
-    self.key_order = ['first', 'second', '...', 'last']
+    It can be overridden per instance by assigning `self.key_order`.
+
+    `key_order` is compiled into a rank table once per class (or override),
+    and new keys are moved into place as they are inserted, so the object
+    is always in order without re-sorting.
     """
 
+    key_order = None
+    _key_ranks = None
+
+    # Domain -> bound `from_xxx_config` converter, built per class
+    converters = {}
+
+    _CONVERTER_NAME = re.compile(r'^from_(\w+)_config$')
+
+    def __init_subclass__(cls, **kwargs):
+        """Compile `key_order` and collect the converters of a subclass."""
+        super().__init_subclass__(**kwargs)
+        if 'key_order' in cls.__dict__:
+            cls._key_ranks = compile_key_order(cls.key_order)
+
+        cls.converters = {}
+        for name in dir(cls):
+            match = cls._CONVERTER_NAME.match(name)
+            if match:
+                cls.converters[match.group(1)] = getattr(cls, name)
+
     def __init__(self, **kwargs):
         """Initialize the object."""
         self.update(kwargs)
@@ -88,11 +194,16 @@ class LovelaceBase(OrderedDict):
             if value is None:
                 del self[key]
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == 'key_order':
+            super().__setattr__('_key_ranks', compile_key_order(value))
+
     def __setitem__(self, key, value):
-        sort = key not in self.keys()
+        place = key not in self
         super().__setitem__(key, value)
-        if sort:
-            self.sortkeys()
+        if place and self._key_ranks is not None:
+            self._place_key(key)
 
     @classmethod
     def from_config(cls, config):
@@ -102,6 +213,9 @@ class LovelaceBase(OrderedDict):
         from_camera_config(cls, config)
         from_media_player_config(cls, config)
         from_group_config(cls, config)
+
+        They are collected into `converters` when the class is defined, and
+        more can be added with `register_converter`.
         """
 
         def invalid_config(cls, config={}, exception=None):
@@ -109,7 +223,7 @@ class LovelaceBase(OrderedDict):
             _LOGGER.error("Invalid config for conversion to '{}': {}"
                           "".format(cls.__name__, exception))
             if config is not None:
-                output = json.dumps(config, indent=2)
+                output = json.dumps(config, indent=2, default=dict)
             else:
                 output = config
             _LOGGER.debug("Invalid config: {}".format(output))
@@ -121,12 +235,26 @@ class LovelaceBase(OrderedDict):
         entity_id = config['entity_id']
         domain, object_id = entity_id.split('.', 1)
 
-        fx = getattr(cls, "from_" + domain + "_config", None)
+        fx = cls.converters.get(domain)
         if fx is None:
             _LOGGER.error("Class '{}' does not support conversion from "
                           "'{}' config".format(cls.__name__, domain))
             return None
-        return fx(config)
+
+        return cls.convert(fx, config)
+
+    @classmethod
+    def convert(cls, fx, config):
+        """Run converter `fx` on `config` through the conversion cache."""
+        cache = _CONVERSION_CACHE.get()
+        if cache is None:
+            return fx(config)
+        return cache.convert(cls, fx, config)
+
+    @classmethod
+    def register_converter(cls, domain, fx):
+        """Register `fx(config)` to convert `domain` entities to `cls`."""
+        cls.converters[domain] = fx
 
     def add_item(self, key, item):
         """Add item(s) to the object."""
@@ -138,41 +266,229 @@ class LovelaceBase(OrderedDict):
             else:
                 self[key].append(item)
 
+    def __deepcopy__(self, memo):
+        copy = OrderedDict.__new__(self.__class__)
+        memo[id(self)] = copy
+        copy.__dict__.update(deepcopy(self.__dict__, memo))
+        for key, value in self.items():
+            OrderedDict.__setitem__(copy, key, deepcopy(value, memo))
+        return copy
+
+    def __reduce__(self):
+        # Rebuilt without calling `__init__`, whose arguments differ between
+        # subclasses (e.g. `CustomCard`), so objects can cross processes
+        return (_rebuild_lovelace,
+                (self.__class__, self.__dict__, list(self.items())))
+
+    def compact(self):
+        """Return a compact, read-only `LovelaceRecord` copy of the object."""
+        return LovelaceRecord((key, _compact_value(value))
+                              for key, value in self.items())
+
     def sortkeys(self, key_order=None, delim='...'):
         """Iterate keys of OrderedDict and move to front/back as necessary."""
-        # Get `keys` from self, but fallback on parent
         if key_order is None:
-            try:
-                key_order = self.key_order
-            except AttributeError:
-                try:
-                    key_order = super(OrderedDict, self).key_order
-                except AttributeError:
-                    pass
+            ranks = self._key_ranks
+        else:
+            ranks = compile_key_order(key_order, delim)
 
-        if key_order is None:
+        if not ranks:
             return
 
-        # Make a copy so that we're not changing the original
-        key_order = key_order[:]
+        for key in sorted(self, key=lambda key: ranks.get(key, 0)):
+            self.move_to_end(key)
 
-        # Check to see if delimiter is in `key_order`
-        if delim in key_order:
-            mid = key_order.index(delim)
-        else:
-            mid = len(key_order)
+    def _place_key(self, key):
+        """Move keys that rank after the newly appended `key` behind it."""
+        ranks = self._key_ranks
+        rank = ranks.get(key, 0)
 
-        # Reverse the front keys
-        key_order[:mid] = key_order[:mid][::-1]
+        # Keys are already in order, so the ones to move are a suffix
+        following = []
+        keys = reversed(self)
+        next(keys)
+        for other in keys:
+            if ranks.get(other, 0) <= rank:
+                break
+            following.append(other)
+
+        for other in reversed(following):
+            OrderedDict.move_to_end(self, other)
 
-        # Iterate keys and move them accordingly
-        for i, key in enumerate(key_order):
-            # Skip delimiter and missing keys
-            if i == mid or key not in self:
-                continue
 
-            # Move to front/back
-            self.move_to_end(key, last=i > mid)
+def _rebuild_lovelace(cls, state, items):
+    """Rebuild a pickled `LovelaceBase` object with its keys in order."""
+    obj = OrderedDict.__new__(cls)
+    obj.__dict__.update(state)
+    for key, value in items:
+        OrderedDict.__setitem__(obj, key, value)
+    return obj
+
+
+class ConversionCache(object):
+    """
+    Per-run cache of converted entities, keyed by class and `entity_id`.
+
+    A group referenced from several views or parent groups is converted only
+    once. With `share`, every reference gets the same converted objects;
+    otherwise each reference after the first gets a deep copy.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, share=True):
+        """Initialize the cache."""
+        self.share = share
+        self.results = {}
+
+    def convert(self, cls, fx, config):
+        """Return the cached result of `fx(config)`, converting on a miss."""
+        key = (cls, config['entity_id'])
+        result = self.results.get(key, self._MISSING)
+        if result is self._MISSING:
+            result = self.results[key] = fx(config)
+        elif not self.share:
+            result = deepcopy(result)
+        return result
+
+
+class StateView(Mapping):
+    """
+    Read-only view of an entity from the states JSON.
+
+    Adds the derived fields the converters rely on: `domain`, `object_id`,
+    a `friendly_name` attribute built from the object ID when it is missing
+    and, for entities with an `entity_id` attribute, the `entities` they
+    contain (looked up in `entities`). Derived fields are computed on first
+    access; the underlying state object is never modified.
+    """
+
+    __slots__ = ('_state', '_entities', '_attributes', '_members')
+
+    def __init__(self, state, entities):
+        """Initialize the view of `state`."""
+        self._state = state
+        self._entities = entities
+        self._attributes = None
+        self._members = None
+
+    def __getitem__(self, key):
+        if key == 'domain':
+            return self._state['entity_id'].split('.', 1)[0]
+        if key == 'object_id':
+            return self._state['entity_id'].split('.', 1)[1]
+        if key == 'attributes':
+            if self._attributes is None:
+                self._attributes = AttributesView(
+                    self._state['attributes'], self['object_id'])
+            return self._attributes
+        if key == 'entities':
+            if self._members is None:
+                if 'entity_id' not in self._state['attributes']:
+                    raise KeyError(key)
+                self._members = {
+                    x: self._entities[x]
+                    for x in self._state['attributes']['entity_id']
+                    if x in self._entities}
+            return self._members
+        return self._state[key]
+
+    def __iter__(self):
+        yield from self._state
+        yield 'domain'
+        yield 'object_id'
+        if 'entity_id' in self._state['attributes']:
+            yield 'entities'
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+
+class AttributesView(Mapping):
+    """Read-only view of entity attributes with a default `friendly_name`."""
+
+    __slots__ = ('_attributes', '_object_id')
+
+    def __init__(self, attributes, object_id):
+        """Initialize the view of `attributes`."""
+        self._attributes = attributes
+        self._object_id = object_id
+
+    def __getitem__(self, key):
+        if key == 'friendly_name' and key not in self._attributes:
+            return self._object_id.replace('_', ' ').title()
+        return self._attributes[key]
+
+    def __iter__(self):
+        yield from self._attributes
+        if 'friendly_name' not in self._attributes:
+            yield 'friendly_name'
+
+    def __len__(self):
+        return len(self._attributes) + (
+            'friendly_name' not in self._attributes)
+
+
+class LovelaceRecord(Mapping):
+    """
+    Compact, read-only snapshot of a Lovelace object.
+
+    Values are kept in a tuple next to a tuple of keys that is shared by
+    every record with the same keys, in the same order. This costs a
+    fraction of the memory of the `OrderedDict` it was made from and
+    serializes identically.
+    """
+
+    __slots__ = ('_keys', '_values')
+
+    _shared_keys = {}
+
+    def __init__(self, items=()):
+        """Initialize the record from (key, value) pairs."""
+        keys, values = [], []
+        for key, value in items:
+            keys.append(key)
+            values.append(value)
+        keys = tuple(keys)
+        self._keys = self._shared_keys.setdefault(keys, keys)
+        self._values = tuple(values)
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, list(self.items()))
+
+    def items(self):
+        """Return a view of the (key, value) pairs in order."""
+        return LovelaceRecordItems(self)
+
+
+class LovelaceRecordItems(ItemsView):
+    """Items view of a `LovelaceRecord` that iterates without lookups."""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        return zip(self._mapping._keys, self._mapping._values)
+
+
+def _compact_value(value):
+    """Compact Lovelace objects nested in `value`."""
+    if isinstance(value, LovelaceBase):
+        return value.compact()
+    if isinstance(value, list):
+        return [_compact_value(item) for item in value]
+    return value
 
 
 class Lovelace(LovelaceBase):
@@ -181,17 +497,15 @@ class Lovelace(LovelaceBase):
     class View(LovelaceBase):
         """Lovelace UI view representation."""
 
-        def __init__(self, **kwargs):
-            """Init view."""
-            self.key_order = ['title', 'id', 'icon', 'panel', 'theme', '...',
-                              'cards']
-            super().__init__(**kwargs)
+        key_order = ['title', 'id', 'icon', 'panel', 'theme', '...',
+                     'cards']
 
         def add_card(self, card):
             """Add a card to the view."""
             return self.add_item('cards', card)
 
         @classmethod
+        @reads('entity_id', 'friendly_name', 'icon', 'view')
         def from_group_config(cls, group):
             """Build the view from `group` config."""
             if not group['attributes'].get('view', False):
@@ -228,39 +542,37 @@ class Lovelace(LovelaceBase):
             if cls is not Lovelace.Card:
                 return super().from_config(config)
 
-            domain = config['domain']
-            if domain in Lovelace.CARD_DOMAINS:
-                cls = Lovelace.CARD_DOMAINS[domain]
-                return cls.from_config(config)
-
-            return None
+            converter = Lovelace.CARD_CONVERTERS.get(config['domain'])
+            if converter is None:
+                return None
+            card, fx = converter
+            return card.convert(fx, config)
 
     # @todo Implement use of this in `add_entity`
     class Entity(LovelaceBase):
         """Lovelace UI entity representation."""
 
-        def __init__(self, **kwargs):
-            """Init entity."""
-            self.key_order = ['entity', 'name']
-            super().__init__(**kwargs)
+        key_order = ['entity', 'name']
 
     class Resource(LovelaceBase):
         """Lovelace UI resource representation."""
 
+        key_order = ['url', 'type']
+
         def __init__(self, **kwargs):
             """Init resource."""
-            self.key_order = ['url', 'type']
             kwargs.setdefault('type', 'js')
             super().__init__(**kwargs)
 
     class EntitiesCard(Card):
         """Lovelove UI `entities` card representation."""
 
+        key_order = ['type', 'title', 'show_header_toggle', '...',
+                     'entities']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'entities'
-            self.key_order = ['type', 'title', 'show_header_toggle', '...',
-                              'entities']
             super().__init__(**kwargs)
 
         def add_entity(self, entity):
@@ -268,6 +580,7 @@ class Lovelace(LovelaceBase):
             return self.add_item('entities', entity)
 
         @classmethod
+        @reads('control', 'entity_id', 'friendly_name')
         def from_group_config(cls, group):
             """Build the card from `group` config."""
             control = group['attributes'].get('control') != 'hidden'
@@ -293,11 +606,12 @@ class Lovelace(LovelaceBase):
     class EntityFilterCard(Card):
         """Lovelove UI `entity-filter` card representation."""
 
+        key_order = ['type', 'entities', 'state_filter', 'card',
+                     'show_empty']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'entity-filter'
-            self.key_order = ['type', 'entities', 'state_filter', 'card',
-                              'show_empty']
             super().__init__(**kwargs)
 
         def add_entity(self, entity):
@@ -311,10 +625,11 @@ class Lovelace(LovelaceBase):
     class GlanceCard(Card):
         """Lovelove UI `glance` card representation."""
 
+        key_order = ['type', 'title', '...', 'entities']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'glance'
-            self.key_order = ['type', 'title', '...', 'entities']
             super().__init__(**kwargs)
 
         def add_entity(self, entity):
@@ -324,11 +639,12 @@ class Lovelace(LovelaceBase):
     class HistoryGraphCard(Card):
         """Lovelove UI `history-graph` card representation."""
 
+        key_order = ['type', 'title', 'hours_to_show',
+                     'refresh_interval', '...', 'entities']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'history-graph'
-            self.key_order = ['type', 'title', 'hours_to_show',
-                              'refresh_interval', '...', 'entities']
             super().__init__(**kwargs)
 
         def add_entity(self, entity):
@@ -336,6 +652,7 @@ class Lovelace(LovelaceBase):
             return self.add_item('entities', entity)
 
         @classmethod
+        @reads('entity_id', 'friendly_name', 'hours_to_show', 'refresh')
         def from_history_graph_config(cls, config):
             """Build the card from `history_graph` config."""
             return cls(title=config['attributes'].get('friendly_name'),
@@ -346,10 +663,11 @@ class Lovelace(LovelaceBase):
     class HorizontalStackCard(Card):
         """Lovelove UI `horizontal-stack` card representation."""
 
+        key_order = ['type', '...', 'cards']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'horizontal-stack'
-            self.key_order = ['type', '...', 'cards']
             super().__init__(**kwargs)
 
         def add_card(self, card):
@@ -359,20 +677,22 @@ class Lovelace(LovelaceBase):
     class IframeCard(Card):
         """Lovelove UI `iframe` card representation."""
 
+        key_order = ['type', 'title', 'url', 'aspect_ratio']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'iframe'
-            self.key_order = ['type', 'title', 'url', 'aspect_ratio']
             super().__init__(**kwargs)
 
     class MapCard(Card):
         """Lovelove UI `map` card representation."""
 
+        key_order = ['type', 'title', 'aspect_ratio', '...',
+                     'entities']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'map'
-            self.key_order = ['type', 'title', 'aspect_ratio', '...',
-                              'entities']
             super().__init__(**kwargs)
 
         def add_entity(self, entity):
@@ -382,22 +702,25 @@ class Lovelace(LovelaceBase):
     class MarkdownCard(Card):
         """Lovelove UI `markdown` card representation."""
 
+        key_order = ['type', 'title', '...', 'content']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'markdown'
-            self.key_order = ['type', 'title', '...', 'content']
             super().__init__(**kwargs)
 
     class MediaControlCard(Card):
         """Lovelove UI `media-control` card representation."""
 
+        key_order = ['type', 'entity']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'media-control'
-            self.key_order = ['type', 'entity']
             super().__init__(**kwargs)
 
         @classmethod
+        @reads()
         def from_media_player_config(cls, config):
             """Build the card from `media_player` config."""
             return cls(entity=config['entity_id'])
@@ -405,20 +728,22 @@ class Lovelace(LovelaceBase):
     class PictureCard(Card):
         """Lovelove UI `picture` card representation."""
 
+        key_order = ['type', 'image', 'navigation_path', 'service',
+                     'service_data']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'picture'
-            self.key_order = ['type', 'image', 'navigation_path', 'service',
-                              'service_data']
             super().__init__(**kwargs)
 
     class PictureElementsCard(Card):
         """Lovelove UI `picture-elements` card representation."""
 
+        key_order = ['type', 'title', 'image', 'elements']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'picture-elements'
-            self.key_order = ['type', 'title', 'image', 'elements']
             super().__init__(**kwargs)
 
         def add_element(self, element):
@@ -428,15 +753,17 @@ class Lovelace(LovelaceBase):
     class PictureEntityCard(Card):
         """Lovelove UI `picture-entity` card representation."""
 
+        key_order = ['type', 'title', 'entity', 'camera_image',
+                     'image', 'state_image', 'show_info',
+                     'tap_action']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'picture-entity'
-            self.key_order = ['type', 'title', 'entity', 'camera_image',
-                              'image', 'state_image', 'show_info',
-                              'tap_action']
             super().__init__(**kwargs)
 
         @classmethod
+        @reads('friendly_name')
         def from_camera_config(cls, config):
             """Build the card from `camera` config."""
             return cls(title=config['attributes'].get('friendly_name'),
@@ -448,22 +775,25 @@ class Lovelace(LovelaceBase):
     class PictureGlanceCard(Card):
         """Lovelove UI `picture-glance` card representation."""
 
+        key_order = ['type', 'title', '...', 'entities']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'picture-glance'
-            self.key_order = ['type', 'title', '...', 'entities']
             super().__init__(**kwargs)
 
     class PlantStatusCard(Card):
         """Lovelove UI `plant-status` card representation."""
 
+        key_order = ['type', 'entity']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'plant-status'
-            self.key_order = ['type', 'entity']
             super().__init__(**kwargs)
 
         @classmethod
+        @reads()
         def from_plant_config(cls, config):
             """Build the card from `plant` config."""
             return cls(entity=config['entity_id'])
@@ -471,10 +801,11 @@ class Lovelace(LovelaceBase):
     class VerticalStackCard(Card):
         """Lovelove UI `vertical-stack` card representation."""
 
+        key_order = ['type', '...', 'cards']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'vertical-stack'
-            self.key_order = ['type', '...', 'cards']
             super().__init__(**kwargs)
 
         def add_card(self, card):
@@ -484,13 +815,15 @@ class Lovelace(LovelaceBase):
     class WeatherForecastCard(Card):
         """Lovelove UI `weather-forecast` card representation."""
 
+        key_order = ['type', 'entity']
+
         def __init__(self, **kwargs):
             """Init card."""
             self['type'] = 'weather-forecast'
-            self.key_order = ['type', 'entity']
             super().__init__(**kwargs)
 
         @classmethod
+        @reads()
         def from_weather_config(cls, config):
             """Build the card from `weather` config."""
             return cls(entity=config['entity_id'])
@@ -498,6 +831,8 @@ class Lovelace(LovelaceBase):
     class CustomCard(Card):
         """Lovelace UI `custom` card representation."""
 
+        key_order = ['type', '...']
+
         def __init__(self, card_type, resource=None, key_order=None, **kwargs):
             """Init card."""
             if card_type in Lovelace.CUSTOM_CARDS:
@@ -508,7 +843,8 @@ class Lovelace(LovelaceBase):
                     key_order = custom['key_order']
 
             self['type'] = 'custom:' + card_type
-            self.key_order = key_order or ['type', '...']
+            if key_order is not None:
+                self.key_order = key_order
             self.resource = resource
             super().__init__(**kwargs)
 
@@ -535,6 +871,10 @@ class Lovelace(LovelaceBase):
         'weather': WeatherForecastCard,
     }
 
+    # Domain -> (card class, converter) for the classes in `CARD_DOMAINS`
+    CARD_CONVERTERS = {domain: (card, card.converters[domain])
+                       for domain, card in CARD_DOMAINS.items()}
+
     CUSTOM_CARDS = {
         'monster-card': {
             'resource': 'https://cdn.rawgit.com/ciotlosm/custom-lovelace/c9465a72a2f484fce135dce86c35412f099d493f/monster-card/monster-card.js',
@@ -542,24 +882,73 @@ class Lovelace(LovelaceBase):
         },
     }
 
-    def __init__(self, states_json, title=None):
-        """Convert existing Home Assistant config to Lovelace UI."""
-        self.key_order = ['title', 'resources', 'excluded_entities',
-                          '...', 'views']
+    MAX_GROUP_DEPTH = 32
+
+    # Entity attributes read by `Lovelace` itself, on top of the converters
+    STATE_ATTRIBUTES = frozenset(['entity_id', 'view'])
+
+    key_order = ['title', 'resources', 'excluded_entities', '...', 'views']
+
+    DUMP_FORMATS = ('yaml', 'json', 'msgpack')
+
+    def __init__(self, states_json, title=None, compact=False, share=True,
+                 max_depth=MAX_GROUP_DEPTH, executor=None):
+        """
+        Convert existing Home Assistant config to Lovelace UI.
+
+        With `compact`, views are stored as `LovelaceRecord` objects to save
+        memory on very large dashboards. Groups referenced from several
+        places are converted once; `share` selects whether the converted
+        cards are shared between those places or deep copied. Groups are
+        nested at most `max_depth` levels deep.
+
+        With an `executor` (e.g. a `ProcessPoolExecutor`), view groups are
+        converted in parallel by `convert_view`. Groups used by several
+        views are then converted once per view. The converter `registry`
+        is sent along, so cards and converters registered at runtime must
+        be picklable (module-level functions and classes).
+        """
+        self.compact_views = compact
+        self.max_depth = max_depth
+        self.share = share
+        self.executor = executor
         super().__init__()
 
         self['title'] = title or "Home"
 
+        token = _CONVERSION_CACHE.set(ConversionCache(share))
+        try:
+            self.build_views(states_json)
+        finally:
+            _CONVERSION_CACHE.reset(token)
+
+    def build_views(self, states_json):
+        """Convert the states JSON and add the resulting views."""
         # Build states and entities objects from the states JSON
         self._states = states = self.build_states(states_json)
+        cuts = [problem[-2:]
+                for problem in self.check_groups(states, self.max_depth)]
 
         groups = states.get('group', {})
         views = {k: v for k, v in groups.items()
                  if v['attributes'].get('view', False)}
-
-        if 'default_view' in views:
-            self.add_view(Lovelace.View.from_config(
-                views.pop('default_view')))
+        default_view = views.pop('default_view', None)
+
+        if self.executor is not None:
+            # Workers started with `spawn` or `forkserver` only have the
+            # registry as of import time, so send the current one
+            registry = Lovelace.registry()
+
+            # Submit the other views first, so they are converted while the
+            # first view is built here
+            futures = [self.executor.submit(convert_view,
+                                            *self.view_payload(view, cuts),
+                                            registry=registry,
+                                            share=self.share)
+                       for view in views.values()]
+
+        if default_view is not None:
+            self.add_view(Lovelace.View.from_config(default_view))
         else:
             view = Lovelace.View(title='Home')
 
@@ -576,8 +965,98 @@ class Lovelace(LovelaceBase):
             if view.get('cards') is not None:
                 self.add_view(view)
 
-        for view in views.values():
-            self.add_view(Lovelace.View.from_config(view))
+        if self.executor is not None:
+            for future in futures:
+                self.add_view(future.result())
+        else:
+            for view in views.values():
+                self.add_view(Lovelace.View.from_config(view))
+
+    @staticmethod
+    def view_payload(view, cuts):
+        """
+        Return the arguments of `convert_view` for the `view` entity.
+
+        These are the raw states of the view and everything it contains,
+        and the (parent, child) member references dropped by `check_groups`
+        among them.
+        """
+        states = []
+        seen = set()
+        pending = [view]
+
+        while pending:
+            e = pending.pop()
+            if e['entity_id'] in seen:
+                continue
+            seen.add(e['entity_id'])
+            states.append(e._state)
+            if 'entity_id' in e['attributes']:
+                pending.extend(reversed(list(e['entities'].values())))
+
+        # Members outside the subtree are left out of the payload anyway
+        cuts = [(parent, child) for parent, child in cuts
+                if parent in seen and child in seen]
+        return states, cuts
+
+    @classmethod
+    def state_attributes(cls):
+        """
+        Return the set of entity attributes read during conversion.
+
+        Built from the `reads` declarations of the view and card converters.
+        Returns None (keep everything) if any converter does not declare
+        the attributes it reads.
+        """
+        attributes = set(cls.STATE_ATTRIBUTES)
+        for fx in (list(cls.View.converters.values()) +
+                   [fx for card, fx in cls.CARD_CONVERTERS.values()]):
+            if getattr(fx, 'attributes', None) is None:
+                return None
+            attributes |= fx.attributes
+        return frozenset(attributes)
+
+    @classmethod
+    def registry(cls):
+        """
+        Return the converter registry, to be restored with `use_registry`.
+
+        This is `CARD_DOMAINS`, `CARD_CONVERTERS`, `CUSTOM_CARDS` and the
+        `converters` of the view and card classes, including everything
+        registered at runtime.
+        """
+        classes = [value for value in vars(cls).values()
+                   if isinstance(value, type) and
+                   issubclass(value, LovelaceBase)]
+        classes.extend(card for card in cls.CARD_DOMAINS.values()
+                       if card not in classes)
+        return {
+            'card_domains': dict(cls.CARD_DOMAINS),
+            'card_converters': dict(cls.CARD_CONVERTERS),
+            'custom_cards': dict(cls.CUSTOM_CARDS),
+            'converters': [(card, dict(card.converters))
+                           for card in classes],
+        }
+
+    @classmethod
+    def use_registry(cls, registry):
+        """Install a converter `registry` returned by `registry`."""
+        # Replaced rather than updated, so a thread iterating the old
+        # mappings is not disturbed
+        cls.CARD_DOMAINS = registry['card_domains']
+        cls.CARD_CONVERTERS = registry['card_converters']
+        cls.CUSTOM_CARDS = registry['custom_cards']
+        for card, converters in registry['converters']:
+            card.converters = converters
+
+    @classmethod
+    def register_card(cls, domain, card):
+        """Use `card` to convert entities of `domain` in `Card.from_config`."""
+        if domain not in card.converters:
+            raise ValueError("Class '{}' does not support conversion from "
+                             "'{}' config".format(card.__name__, domain))
+        cls.CARD_DOMAINS[domain] = card
+        cls.CARD_CONVERTERS[domain] = (card, card.converters[domain])
 
     def add_resource(self, resource):
         """Add a resource to the UI."""
@@ -589,22 +1068,15 @@ class Lovelace(LovelaceBase):
 
     def add_view(self, view):
         """Add a view to the UI."""
+        if self.compact_views and isinstance(view, LovelaceBase):
+            view = view.compact()
         return self.add_item('views', view)
 
     def build_states(self, states_json):
         """Build a states object from states JSON."""
-        all_entities = self.build_entities(states_json)
         states = {}
 
-        for e in all_entities.values():
-            if 'entity_id' in e['attributes']:
-                e['entities'] = {}
-                for x in e['attributes']['entity_id']:
-                    if x in all_entities:
-                        e['entities'].update({
-                            x: all_entities[x]
-                        })
-
+        for e in self.build_entities(states_json).values():
             if e['domain'] not in states:
                 states[e['domain']] = {}
 
@@ -614,65 +1086,653 @@ class Lovelace(LovelaceBase):
 
         return states
 
+    def check_groups(self, states, max_depth):
+        """
+        Break cycles and limit nesting depth in the group graph.
+
+        Groups are walked iteratively. A member reference that closes a
+        cycle, or that would nest groups more than `max_depth` levels deep,
+        is dropped from its parent group and reported. Returns the list of
+        offending paths (lists of entity IDs).
+        """
+        def subgroups(group):
+            """Return the member groups of `group`."""
+            return [e for e in group.get('entities', {}).values()
+                    if e['domain'] == 'group']
+
+        # Height of each fully walked group's (pruned) subtree
+        heights = {}
+        problems = []
+
+        for root in states.get('group', {}).values():
+            if root['entity_id'] in heights:
+                continue
+
+            path = [root]
+            on_path = {root['entity_id']}
+            stack = [iter(subgroups(root))]
+
+            while stack:
+                parent = path[-1]
+                for child in stack[-1]:
+                    child_id = child['entity_id']
+                    if child_id in on_path:
+                        ids = [e['entity_id'] for e in path]
+                        problem = ids[ids.index(child_id):] + [child_id]
+                        _LOGGER.error("Group cycle detected, ignoring '{}' "
+                                      "in '{}': {}".format(
+                                          child_id, parent['entity_id'],
+                                          " -> ".join(problem)))
+                    elif len(path) + heights.get(child_id, 1) > max_depth:
+                        problem = [e['entity_id'] for e in path] + [child_id]
+                        _LOGGER.error("Groups nested deeper than {}, "
+                                      "ignoring '{}' in '{}'".format(
+                                          max_depth, child_id,
+                                          parent['entity_id']))
+                    elif child_id in heights:
+                        continue
+                    else:
+                        path.append(child)
+                        on_path.add(child_id)
+                        stack.append(iter(subgroups(child)))
+                        break
+
+                    problems.append(problem)
+                    del parent['entities'][child_id]
+                else:
+                    heights[parent['entity_id']] = 1 + max(
+                        [heights[e['entity_id']] for e in subgroups(parent)],
+                        default=0)
+                    on_path.remove(parent['entity_id'])
+                    path.pop()
+                    stack.pop()
+
+        return problems
+
     def build_entities(self, states_json):
-        """Build a list of entities from states JSON."""
+        """
+        Build a list of entities from states JSON.
+
+        Entities are `StateView` objects layered over the states JSON, which
+        is left untouched so it can be reused for other conversions.
+        """
         entities = {}
 
         for e in states_json:
-            # Add domain and object_id
-            e['domain'], e['object_id'] = e['entity_id'].split('.', 1)
+            entities[e['entity_id']] = StateView(e, entities)
 
-            # Add name from `friendly_name` or build from `object_id`
-            e['attributes']['friendly_name'] = e['attributes'].get(
-                'friendly_name', e['object_id'].replace('_', ' ').title())
+        return entities
 
-            # Add entity to the entities object
-            entities[e['entity_id']] = e
+    def dump(self, fmt='yaml', pyyaml=False, executor=None):
+        """
+        Dump the Lovelace UI in format `fmt` (see `DUMP_FORMATS`).
 
-        return entities
+        YAML is written by `write_yaml` unless `pyyaml` is set, in which
+        case the document goes through PyYAML's representer, serializer and
+        emitter. `write_yaml` serializes the views in parallel if given an
+        `executor`. `msgpack` output is returned as bytes.
 
-    def dump(self):
-        """Dump YAML for the Lovelace UI."""
-        def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwargs):
-            """YAML dumper for OrderedDict."""
+        The tree is serialized on every call, as any list in it may have
+        changed; callers that need the output twice should keep it.
+        """
+        if fmt == 'msgpack':
+            stream = io.BytesIO()
+            self.dump_to(stream, fmt, pyyaml=pyyaml)
+            return stream.getvalue()
 
-            class OrderedDumper(Dumper):
-                """Wrapper class for YAML dumper."""
+        stream = io.StringIO()
+        self.dump_to(stream, fmt, pyyaml=pyyaml, executor=executor)
+        return stream.getvalue().strip()
 
-                def ignore_aliases(self, data):
-                    """Disable aliases in YAML dump."""
-                    return True
+    def dump_to(self, stream, fmt='yaml', pyyaml=False, executor=None):
+        """
+        Write the Lovelace UI in format `fmt` to the file object `stream`.
 
-                def increase_indent(self, flow=False, indentless=False):
-                    """Increase indent on YAML lists."""
-                    return super(OrderedDumper, self).increase_indent(
-                        flow, False)
+        The document is written piece by piece as it is serialized, without
+        building it in memory first. `stream` must be opened in binary mode
+        for `msgpack`. See `dump` for `executor`.
+        """
+        if fmt == 'yaml':
+            if pyyaml:
+                ordered_dump(self, stream, Dumper=safe_dumper(),
+                             default_flow_style=False)
+            else:
+                write_yaml(self, stream, executor)
+        elif fmt == 'json':
+            json.dump(self, stream, separators=(',', ':'), default=dict)
+            stream.write('\n')
+        elif fmt == 'msgpack':
+            # Imported here since msgpack is only needed for this format
+            import msgpack
+
+            # Strict types make OrderedDicts go through `default`, which
+            # keeps their order
+            msgpack.pack(self, stream, default=dict, strict_types=True)
+        else:
+            raise ValueError("Unsupported format: {}".format(fmt))
 
-            def _dict_representer(dumper, data):
-                """Function to represent OrderDict and derivitives."""
-                return dumper.represent_mapping(
-                    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-                    data.items())
 
-            OrderedDumper.add_multi_representer(OrderedDict, _dict_representer)
-            return yaml.dump(data, stream, OrderedDumper, **kwargs)
+def convert_view(states_json, cuts, registry=None, share=True):
+    """
+    Convert a view from the payload built by `Lovelace.view_payload`.
+
+    The first state is the view group. Runs in executor workers, so
+    everything it takes and returns is picklable. A `registry` from
+    `Lovelace.registry` is installed before converting.
+    """
+    if registry is not None:
+        Lovelace.use_registry(registry)
 
-        return ordered_dump(self, Dumper=yaml.SafeDumper,
-                            default_flow_style=False).strip()
+    entities = {}
+    for e in states_json:
+        entities[e['entity_id']] = StateView(e, entities)
+
+    for parent, child in cuts:
+        entities[parent]['entities'].pop(child, None)
+
+    token = _CONVERSION_CACHE.set(ConversionCache(share))
+    try:
+        return Lovelace.View.from_config(entities[states_json[0]['entity_id']])
+    finally:
+        _CONVERSION_CACHE.reset(token)
+
+
+def ordered_dump(data, stream=None, Dumper=None, **kwargs):
+    """YAML dumper for OrderedDict."""
+    # Imported here to keep startup fast when no YAML is emitted
+    import yaml
+
+    return yaml.dump(data, stream, ordered_dumper(Dumper or yaml.Dumper),
+                     **kwargs)
+
+
+@lru_cache(maxsize=None)
+def ordered_dumper(Dumper):
+    """Build (once per base class) a YAML dumper class for OrderedDict."""
+    import yaml
+
+    class OrderedDumper(Dumper):
+        """Wrapper class for YAML dumper."""
+
+        def ignore_aliases(self, data):
+            """Disable aliases in YAML dump."""
+            return True
+
+        def increase_indent(self, flow=False, indentless=False):
+            """Increase indent on YAML lists."""
+            return super(OrderedDumper, self).increase_indent(flow, False)
+
+    def _dict_representer(dumper, data):
+        """Function to represent OrderDict and derivitives."""
+        return dumper.represent_mapping(
+            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+            data.items())
+
+    OrderedDumper.add_multi_representer(OrderedDict, _dict_representer)
+    OrderedDumper.add_multi_representer(LovelaceRecord, _dict_representer)
+    return OrderedDumper
+
+
+@lru_cache(maxsize=None)
+def safe_dumper():
+    """
+    Return the fastest safe YAML dumper that keeps the Lovelace style.
+
+    libyaml's `CSafeDumper` is used when it is available and dumps a probe
+    document exactly like the pure-Python `SafeDumper`. The libyaml emitter
+    does not honour the `increase_indent` override that indents lists under
+    mapping keys, so in that case `SafeDumper` is used.
+    """
+    import yaml
+
+    if not hasattr(yaml, 'CSafeDumper'):
+        return yaml.SafeDumper
+
+    probe = OrderedDict([('title', "it's"), ('views', [OrderedDict([
+        ('cards', [OrderedDict([('entities', ['a.b', True, 1])])])])])])
+    if (ordered_dump(probe, Dumper=yaml.CSafeDumper,
+                     default_flow_style=False) !=
+            ordered_dump(probe, Dumper=yaml.SafeDumper,
+                         default_flow_style=False)):
+        _LOGGER.debug("libyaml output differs, using pure-Python dumper")
+        return yaml.SafeDumper
+
+    return yaml.CSafeDumper
+
+
+# Plain scalars PyYAML would resolve to something other than a string
+_YAML_IMPLICIT = re.compile(r'''^(?:
+    yes|Yes|YES|no|No|NO|true|True|TRUE|false|False|FALSE|on|On|ON|off|Off|OFF
+    |[-+]?(?:[0-9][0-9_]*)\.[0-9_]*(?:[eE][-+][0-9]+)?
+    |\.[0-9][0-9_]*(?:[eE][-+][0-9]+)?
+    |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\.[0-9_]*
+    |[-+]?\.(?:inf|Inf|INF)
+    |\.(?:nan|NaN|NAN)
+    |[-+]?0b[0-1_]+
+    |[-+]?0[0-7_]+
+    |[-+]?(?:0|[1-9][0-9_]*)
+    |[-+]?0x[0-9a-fA-F_]+
+    |[-+]?[1-9][0-9_]*(?::[0-5]?[0-9])+
+    |<<|~|null|Null|NULL|=
+    |[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]
+    |[0-9][0-9][0-9][0-9] -[0-9][0-9]? -[0-9][0-9]?
+     (?:[Tt]|[\ \t]+)[0-9][0-9]?
+     :[0-9][0-9] :[0-9][0-9] (?:\.[0-9]*)?
+     (?:[\ \t]*(?:Z|[-+][0-9][0-9]?(?::[0-9][0-9])?))?
+    )$''', re.X)
+
+# Characters that cannot start a plain scalar, and sequences that cannot
+# appear in one (in block context)
+_YAML_INDICATORS = re.compile(
+    r"^(?:[#,\[\]{}&*!|>'\"%@`]|[-?:](?: |$)|---|\.\.\.)|: |:$| #")
+
+_YAML_ESCAPES = {
+    '\0': '0', '\x07': 'a', '\x08': 'b', '\t': 't', '\n': 'n',
+    '\x0b': 'v', '\x0c': 'f', '\r': 'r', '\x1b': 'e', '"': '"',
+    '\\': '\\', '\x85': 'N', '\xa0': '_', '\u2028': 'L', '\u2029': 'P',
+}
+
+
+@lru_cache(maxsize=4096)
+def yaml_string(value):
+    """Quote string `value` the way PyYAML's `SafeDumper` does."""
+    if not value:
+        return "''"
+
+    if not all('\x20' <= ch <= '\x7e' for ch in value):
+        # Line breaks, control and non-ASCII characters need escaping
+        chunks = []
+        for ch in value:
+            if ch in _YAML_ESCAPES:
+                chunks.append('\\' + _YAML_ESCAPES[ch])
+            elif '\x20' <= ch <= '\x7e':
+                chunks.append(ch)
+            elif ch <= '\xff':
+                chunks.append('\\x%02X' % ord(ch))
+            elif ch <= '\uffff':
+                chunks.append('\\u%04X' % ord(ch))
+            else:
+                chunks.append('\\U%08X' % ord(ch))
+        return '"' + ''.join(chunks) + '"'
+
+    if (value[0] == ' ' or value[-1] == ' ' or
+            _YAML_INDICATORS.search(value) or _YAML_IMPLICIT.match(value)):
+        return "'" + value.replace("'", "''") + "'"
+
+    return value
+
+
+def yaml_scalar(value):
+    """Represent a scalar `value` as YAML."""
+    if isinstance(value, str):
+        return yaml_string(value)
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return '.nan'
+        if value in (float('inf'), float('-inf')):
+            return '.inf' if value > 0 else '-.inf'
+        value = repr(value).lower()
+        if '.' not in value and 'e' in value:
+            value = value.replace('e', '.0e', 1)
+        return value
+    raise TypeError("Cannot represent {!r} as YAML".format(value))
+
+
+def write_yaml(data, stream, executor=None):
+    """
+    Write `data` to `stream` as block-style YAML.
+
+    Handles the subset of YAML used by Lovelace UI configs: mappings (kept in
+    order), lists, strings, booleans, numbers and null. The output matches
+    `Lovelace.dump(pyyaml=True)`, except that long strings are never folded
+    across lines and strings with line breaks are always double quoted.
+
+    With an `executor`, the items of lists in a top-level mapping (such as
+    the views of a Lovelace UI) are serialized in parallel by
+    `yaml_list_item` and written in order, giving the same output.
+    """
+    write = stream.write
+    if isinstance(data, (dict, Mapping)) and data:
+        if executor is None:
+            _write_yaml_mapping(write, data, 0, '')
+            return
+
+        for key, value in data.items():
+            if isinstance(value, list) and value:
+                write(yaml_scalar(key))
+                write(':\n')
+                for chunk in executor.map(yaml_list_item, value,
+                                          [2] * len(value)):
+                    write(chunk)
+            else:
+                _write_yaml_mapping(write, {key: value}, 0, '')
+    elif isinstance(data, list) and data:
+        _write_yaml_sequence(write, data, 0, '')
+    else:
+        write(_yaml_flow(data))
+        write('\n')
+
+
+def yaml_list_item(item, indent):
+    """Return `item` as YAML for an entry of a list indented by `indent`."""
+    stream = io.StringIO()
+    _write_yaml_sequence(stream.write, [item], indent, ' ' * indent)
+    return stream.getvalue()
+
+
+def _yaml_flow(value):
+    """Represent a scalar or an empty collection as YAML."""
+    if isinstance(value, (dict, Mapping)):
+        return '{}'
+    if isinstance(value, list):
+        return '[]'
+    return yaml_scalar(value)
+
+
+def _write_yaml_mapping(write, mapping, indent, prefix):
+    """Write a non-empty mapping; the first key is prefixed with `prefix`."""
+    pad = ' ' * indent
+    for key, value in mapping.items():
+        write(prefix)
+        write(yaml_scalar(key))
+        if isinstance(value, (dict, Mapping)) and value:
+            write(':\n')
+            _write_yaml_mapping(write, value, indent + 2, pad + '  ')
+        elif isinstance(value, list) and value:
+            write(':\n')
+            _write_yaml_sequence(write, value, indent + 2, pad + '  ')
+        else:
+            write(': ')
+            write(_yaml_flow(value))
+            write('\n')
+        prefix = pad
+
+
+def _write_yaml_sequence(write, sequence, indent, prefix):
+    """Write a non-empty list; the first item is prefixed with `prefix`."""
+    pad = ' ' * indent
+    for item in sequence:
+        write(prefix)
+        write('- ')
+        if isinstance(item, (dict, Mapping)) and item:
+            _write_yaml_mapping(write, item, indent + 2, '')
+        elif isinstance(item, list) and item:
+            _write_yaml_sequence(write, item, indent + 2, '')
+        else:
+            write(_yaml_flow(item))
+            write('\n')
+        prefix = pad
+
+
+CHUNK_SIZE = 65536
+
+
+def read_chunks(f, size=CHUNK_SIZE):
+    """Read file object `f` in chunks of `size`."""
+    return iter(lambda: f.read(size), f.read(0))
+
+
+def project_state(state, attributes):
+    """Return a copy of `state` with only `entity_id` and `attributes`."""
+    return {
+        'entity_id': state['entity_id'],
+        'attributes': {k: v for k, v in state['attributes'].items()
+                       if k in attributes},
+    }
+
+
+def iter_states(chunks, attributes=None):
+    """
+    Incrementally parse a states JSON array from text `chunks`.
+
+    States are yielded one at a time as soon as they are complete, so only
+    the current state (plus a chunk of text) is held in memory. If
+    `attributes` is given (e.g. from `Lovelace.state_attributes`), each
+    state is reduced with `project_state` as soon as it is parsed.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, pos, started = '', 0, False
+
+    def more(size):
+        """Append at least `size` characters to `buf` if available."""
+        nonlocal buf, pos
+        buf, pos = buf[pos:], 0
+        read = []
+        for chunk in chunks:
+            read.append(chunk)
+            size -= len(chunk)
+            if size <= 0:
+                break
+        buf += ''.join(read)
+        return bool(read)
+
+    # What may come next: '[', a state or ']', a state, or ',' or ']'
+    expect = '['
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\n\r':
+            pos += 1
+        if pos == len(buf):
+            if not more(1):
+                raise ValueError("Unexpected end of states JSON")
+            continue
+
+        char = buf[pos]
+        if expect == '[':
+            if char != '[':
+                raise ValueError("States JSON must be a list")
+            expect = 'state or ]'
+            pos += 1
+        elif char == ']' and expect in ('state or ]', ', or ]'):
+            break
+        elif char == ',' and expect == ', or ]':
+            expect = 'state'
+            pos += 1
+        elif expect == ', or ]':
+            raise ValueError("Expected ',' or ']' in states JSON at "
+                             "{!r}".format(buf[pos:pos + 20]))
+        elif char != '{':
+            raise ValueError("States JSON must be a list of objects, found "
+                             "{!r}".format(buf[pos:pos + 20]))
+        else:
+            try:
+                state, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Probably incomplete: read at least as much again as is
+                # buffered, so large states are not re-parsed per chunk
+                if not more(max(len(buf) - pos, 1)):
+                    raise
+                continue
+
+            expect = ', or ]'
+            if attributes is not None:
+                state = project_state(state, attributes)
+            yield state
+
+    # Only whitespace may follow the list
+    rest = buf[pos + 1:]
+    for chunk in chunks:
+        if rest.strip():
+            break
+        rest = chunk
+    if rest.strip():
+        raise ValueError("Extra data after states JSON: {!r}".format(
+            rest.strip()[:20]))
+
+
+DIGEST_COMMENT = '# states-digest: '
+
+
+def states_digest(states_json, attributes=None, context=None):
+    """
+    Return a SHA-256 hex digest of what a conversion of `states_json` uses.
+
+    Only entity IDs and (with `attributes`, only those) attributes are
+    hashed, in input order, so state values and timestamps do not change
+    the digest. `context` can be any JSON value the output also depends
+    on, e.g. the title.
+    """
+    encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(encoder.encode(context).encode())
+
+    for state in states_json:
+        state = project_state(state, attributes or state['attributes'])
+        digest.update(encoder.encode(state).encode())
+
+    return digest.hexdigest()
+
+
+def read_digest(filepath):
+    """Return the states digest in the header of a YAML file, if any."""
+    try:
+        with open(filepath, 'r') as f:
+            for line in f:
+                if not line.startswith('#') and line.strip():
+                    break
+                if line.startswith(DIGEST_COMMENT):
+                    return line[len(DIGEST_COMMENT):].strip()
+    except (FileNotFoundError, PermissionError):
+        pass
+    return None
+
+
+class TTLCache(object):
+    """
+    Cache bounded in size and age.
+
+    Holds at most `maxsize` entries, evicting the least recently used one
+    when full, and treats entries older than `ttl` seconds as missing (no
+    age limit if `ttl` is None). Lookups are counted in `hits` and
+    `misses`.
+    """
+
+    def __init__(self, maxsize=32, ttl=60):
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the value for `key` if cached and fresh, else `default`."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (
+                    self.ttl is None or
+                    time.monotonic() - entry[0] <= self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Cache `value` for `key`."""
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove `key` and return its value, or `default` if missing."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
 
 
 class HomeAssistantAPI(object):
-    """Class to access Home Assistant REST API."""
+    """
+    Class to access Home Assistant REST API.
+
+    Requests go through a persistent session, so connections to the server
+    are kept alive and reused (up to `pool_size` of them at once). Call
+    `close` (or use the object as a context manager) to release them.
+
+    Decoded responses are kept in a `TTLCache` of `cache_size` entries for
+    `cache_ttl` seconds. Once that expires, the endpoint is requested again
+    with the `ETag`/`Last-Modified` validators of the previous response, and
+    a 304 Not Modified answer reuses the previous payload without decoding.
+    Validators (and their payloads) are kept for the `cache_size` most
+    recently used endpoints. `iter_states` caches and revalidates the
+    streamed states the same way.
+
+    `timeout` is a (connect, read) tuple in seconds. Connection errors,
+    timeouts and `RETRY_STATUSES` responses are retried up to `retries`
+    times, sleeping `backoff` seconds before the first retry and doubling
+    that (up to `MAX_BACKOFF`) before each next one. The user is prompted
+    for a password at most `auth_attempts` times per request.
+    """
+
+    RETRY_STATUSES = (502, 503, 504)
+    MAX_BACKOFF = 30
+
+    _MISSING = object()
 
-    def __init__(self, api_url, password=None):
+    def __init__(self, api_url, password=None, pool_size=10,
+                 timeout=(10, 30), retries=3, backoff=0.5, auth_attempts=3,
+                 cache_size=32, cache_ttl=60):
         """Initialize the class object."""
-        self.cache = {}
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.validators = TTLCache(cache_size, None)
         self.api_url = api_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.auth_attempts = auth_attempts
+        self._session = None
 
         if password is None:
             password = self.auth()
         self.password = password
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def session(self):
+        """Return the HTTP session, creating it on first use."""
+        if self._session is None:
+            # Imported here to keep startup fast for local file input
+            import requests
+
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.pool_size)
+            self._session = requests.Session()
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+        return self._session
+
+    def close(self):
+        """Close the HTTP session and its pooled connections."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
     def auth(self):
         """Prompt user to enter a password."""
         try:
@@ -682,34 +1742,397 @@ class HomeAssistantAPI(object):
             sys.exit(130)
 
     def get(self, endpoint='/', refresh=False):
+        """
+        Get the decoded JSON response of a Home Assistant API endpoint.
+
+        If the endpoint has not changed since the previous request, the very
+        same payload object is returned again, so callers can skip work with
+        an identity check.
+        """
+        if not refresh:
+            payload = self.cache.get(endpoint, self._MISSING)
+            if payload is not self._MISSING:
+                return payload
+
+        headers = {}
+        validators = self.validators.get(endpoint)
+        if validators is not None:
+            etag, last_modified, payload = validators
+            if etag:
+                headers['if-none-match'] = etag
+            if last_modified:
+                headers['if-modified-since'] = last_modified
+
+        request = self.request(endpoint, headers=headers)
+        if request.status_code == 304 and validators is not None:
+            _LOGGER.debug("{} not modified".format(endpoint))
+        else:
+            payload = request.json()
+            etag = request.headers.get('etag')
+            last_modified = request.headers.get('last-modified')
+            if etag or last_modified:
+                self.validators.set(endpoint, (etag, last_modified, payload))
+            else:
+                self.validators.pop(endpoint, None)
+
+        self.cache.set(endpoint, payload)
+        return payload
+
+    def request(self, endpoint='/', stream=False, headers=None):
         """Wrapper to send a GET request to Home Assistant API."""
-        if endpoint in self.cache and not refresh:
-            return self.cache[endpoint]
+        # Imported here to keep startup fast for local file input
+        import requests
 
         url = self.api_url + endpoint
-        headers = {'x-ha-access': self.password or '',
-                   'content-type': 'application/json'}
+        retries = auth_attempts = 0
 
-        request = requests.get(url, headers=headers)
+        while True:
+            request_headers = {'x-ha-access': self.password or '',
+                               'content-type': 'application/json'}
+            if headers:
+                request_headers.update(headers)
 
-        if request.status_code == requests.codes.unauthorized:
-            self.password = self.auth()
-            return self.get(endpoint=endpoint, refresh=refresh)
-        else:
-            request.raise_for_status()
+            try:
+                request = self.session.get(url, headers=request_headers,
+                                           stream=stream, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as exc:
+                if retries >= self.retries:
+                    raise
+                _LOGGER.warning("Request to {} failed, retrying: {}"
+                                "".format(url, exc))
+                self.wait(retries)
+                retries += 1
+                continue
+
+            if (request.status_code == requests.codes.unauthorized and
+                    auth_attempts < self.auth_attempts):
+                request.close()
+                self.password = self.auth()
+                auth_attempts += 1
+            elif (request.status_code in self.RETRY_STATUSES and
+                    retries < self.retries):
+                request.close()
+                _LOGGER.warning("Request to {} returned {}, retrying"
+                                "".format(url, request.status_code))
+                self.wait(retries)
+                retries += 1
+            else:
+                request.raise_for_status()
+                return request
 
-        self.cache[endpoint] = request
-        return request
+    def wait(self, retry):
+        """Sleep before retry number `retry` (counting from 0)."""
+        time.sleep(min(self.backoff * 2 ** retry, self.MAX_BACKOFF))
 
     def get_config(self, **kwargs):
         """Get config from Home Assistant REST API."""
-        request = self.get('/config', **kwargs)
-        return request.json()
+        return self.get('/config', **kwargs)
 
     def get_states(self, **kwargs):
         """Get states from Home Assistant REST API."""
-        request = self.get('/states', **kwargs)
-        return request.json()
+        return self.get('/states', **kwargs)
+
+    def iter_states(self, attributes=None, refresh=False):
+        """
+        Stream states from Home Assistant REST API one at a time.
+
+        See `iter_states` for `attributes`. States are cached and revalidated
+        like the payloads of `get` (per set of `attributes`): if they have not
+        changed, the very same state objects are yielded again without
+        downloading or decoding them.
+        """
+        key = ('/states', attributes)
+        if not refresh:
+            states = self.cache.get(key, self._MISSING)
+            if states is not self._MISSING:
+                yield from states
+                return
+
+        headers = {}
+        validators = self.validators.get(key)
+        if validators is not None:
+            etag, last_modified, states = validators
+            if etag:
+                headers['if-none-match'] = etag
+            if last_modified:
+                headers['if-modified-since'] = last_modified
+
+        request = self.request('/states', stream=True, headers=headers)
+        if request.status_code == 304 and validators is not None:
+            request.close()
+            _LOGGER.debug("/states not modified")
+            self.cache.set(key, states)
+            yield from states
+            return
+
+        decoder = codecs.getincrementaldecoder(request.encoding or 'utf-8')()
+        chunks = (decoder.decode(chunk)
+                  for chunk in request.iter_content(CHUNK_SIZE))
+        states = []
+        try:
+            for state in iter_states(chunks, attributes):
+                states.append(state)
+                yield state
+        finally:
+            request.close()
+
+        # Only complete responses are kept
+        etag = request.headers.get('etag')
+        last_modified = request.headers.get('last-modified')
+        if etag or last_modified:
+            self.validators.set(key, (etag, last_modified, states))
+        else:
+            self.validators.pop(key, None)
+        self.cache.set(key, states)
+
+
+class AsyncHomeAssistantAPI(object):
+    """
+    Asyncio counterpart of `HomeAssistantAPI`.
+
+    Each request runs the blocking `HomeAssistantAPI` client in a worker
+    thread, so many instances can be fetched concurrently. At most `limit`
+    requests run at once; pass the same `semaphore` and `executor` to
+    several clients to share that limit between them (see `gather_states`).
+    Other keyword arguments are passed to `HomeAssistantAPI`.
+
+    The client never prompts for a password: `password` must be given (an
+    empty string for none), and `auth_attempts` defaults to 0.
+    """
+
+    def __init__(self, api_url, password='', limit=10, semaphore=None,
+                 executor=None, **kwargs):
+        """Initialize the class object."""
+        if password is None:
+            raise ValueError("AsyncHomeAssistantAPI cannot prompt for a "
+                             "password")
+        kwargs.setdefault('auth_attempts', 0)
+        self.api = HomeAssistantAPI(api_url, password, **kwargs)
+        self.limit = limit
+        self.semaphore = semaphore
+        self.executor = executor
+        self._own_executor = executor is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the HTTP session and any executor created by this client."""
+        self.api.close()
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def run(self, fx, *args):
+        """Run blocking `fx(*args)` in the executor, within the limit."""
+        # Imported here to keep startup fast for the command line tool
+        import asyncio
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.limit)
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(self.limit)
+
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fx, *args)
+
+    async def get(self, endpoint='/', refresh=False):
+        """Get the decoded JSON response of a Home Assistant API endpoint."""
+        return await self.run(self.api.get, endpoint, refresh)
+
+    async def get_config(self, refresh=False):
+        """Get config from Home Assistant REST API."""
+        return await self.get('/config', refresh)
+
+    async def get_states(self, refresh=False):
+        """Get states from Home Assistant REST API."""
+        return await self.get('/states', refresh)
+
+
+async def gather_states(api_urls, password='', limit=10, **kwargs):
+    """
+    Fetch the states of many Home Assistant instances concurrently.
+
+    At most `limit` requests run at once. Returns a list in the order of
+    `api_urls`, holding either the states or the exception raised for that
+    instance (e.g. `HTTPError` for a wrong password, as nothing prompts).
+    Other keyword arguments are passed to `AsyncHomeAssistantAPI`.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    semaphore = asyncio.Semaphore(limit)
+    with ThreadPoolExecutor(limit) as executor:
+        clients = [AsyncHomeAssistantAPI(api_url, password,
+                                         semaphore=semaphore,
+                                         executor=executor, **kwargs)
+                   for api_url in api_urls]
+        try:
+            return await asyncio.gather(
+                *(client.get_states() for client in clients),
+                return_exceptions=True)
+        finally:
+            for client in clients:
+                client.close()
+
+
+class HomeAssistantWebSocket(object):
+    """
+    Class to keep Home Assistant states current over the WebSocket API.
+
+    `connect` authenticates, fetches all states once and subscribes to
+    `state_changed` events; `update` then applies those events to the
+    `states` index (entity ID to state, reduced with `project_state` if
+    `attributes` is given). `version` is increased whenever a change to an
+    indexed state is applied, so callers can tell when to convert again.
+
+    Requires the optional `websocket-client` package.
+    """
+
+    # Seconds to wait for more data while draining pending events
+    POLL_TIMEOUT = 0.01
+
+    def __init__(self, api_url, password=None, attributes=None,
+                 timeout=30):
+        """Initialize the class object."""
+        self.url = re.sub(r'^http', 'ws', api_url) + '/websocket'
+        self.attributes = attributes
+        self.timeout = timeout
+        self.states = OrderedDict()
+        self.version = 0
+        self.connection = None
+        self._id = 0
+        self._results = {}
+
+        if password is None:
+            password = self.auth()
+        self.password = password
+
+    # Prompt for a password the same way as the REST client
+    auth = HomeAssistantAPI.auth
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def connect(self):
+        """Connect, authenticate, load states and subscribe to changes."""
+        # Imported here as websocket-client is an optional dependency
+        import websocket
+
+        self.connection = websocket.create_connection(
+            self.url, timeout=self.timeout)
+
+        message = self.receive()
+        if message['type'] == 'auth_required':
+            self.connection.send(json.dumps(
+                {'type': 'auth', 'api_password': self.password or ''}))
+            message = self.receive()
+            if message['type'] != 'auth_ok':
+                self.close()
+                raise RuntimeError("Authentication failed: {}".format(
+                    message.get('message', message['type'])))
+
+        # Subscribe first, so no change is missed between the two
+        self.result(self.send('subscribe_events', event_type='state_changed'))
+        states = self.result(self.send('get_states'))
+
+        self.states.clear()
+        for state in states:
+            self.set_state(state['entity_id'], state)
+        self.version += 1
+
+    def close(self):
+        """Close the connection."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def send(self, message_type, **kwargs):
+        """Send a command and return its message ID."""
+        self._id += 1
+        kwargs.update(id=self._id, type=message_type)
+        self.connection.send(json.dumps(kwargs))
+        return self._id
+
+    def receive(self):
+        """Receive and decode one message."""
+        return json.loads(self.connection.recv())
+
+    def result(self, message_id):
+        """Wait for the result of a command, handling events meanwhile."""
+        while message_id not in self._results:
+            self.handle(self.receive())
+
+        message = self._results.pop(message_id)
+        if not message.get('success', True):
+            raise RuntimeError("Command failed: {}".format(
+                message.get('error')))
+        return message.get('result')
+
+    def handle(self, message):
+        """Handle a received message."""
+        if message['type'] == 'result':
+            self._results[message['id']] = message
+        elif (message['type'] == 'event' and
+              message['event']['event_type'] == 'state_changed'):
+            data = message['event']['data']
+            if self.set_state(data['entity_id'], data['new_state']):
+                self.version += 1
+
+    def set_state(self, entity_id, state):
+        """Index `state` (None removes it) and return whether it changed."""
+        if state is None:
+            return self.states.pop(entity_id, None) is not None
+
+        if self.attributes is not None:
+            state = project_state(state, self.attributes)
+        if self.states.get(entity_id) == state:
+            return False
+        self.states[entity_id] = state
+        return True
+
+    def update(self, timeout=0):
+        """
+        Apply all pending events, waiting up to `timeout` seconds for one.
+
+        Returns True if any indexed state changed.
+        """
+        # Imported here as websocket-client is an optional dependency
+        import websocket
+
+        version = self.version
+        deadline = time.monotonic() + timeout
+        received = False
+        try:
+            while True:
+                # Block for the rest of `timeout` only until something
+                # arrives, then just drain what is already there
+                wait = deadline - time.monotonic()
+                if received or wait < self.POLL_TIMEOUT:
+                    wait = self.POLL_TIMEOUT
+                self.connection.settimeout(wait)
+                self.handle(self.receive())
+                received = True
+        except websocket.WebSocketTimeoutException:
+            pass
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        return self.version != version
+
+    def get_states(self):
+        """Return the indexed states as a list."""
+        return list(self.states.values())
 
 
 def backup_file(filepath, dry_run=False):
@@ -734,39 +2157,25 @@ def backup_file(filepath, dry_run=False):
     return backupfile
 
 
-def main():
-    """Main program function."""
-    global args
-
-    if args.debug:
-        log_level = logging.DEBUG
-    else:
-        log_level = logging.INFO
-    logging.basicConfig(level=log_level)
+def migrate(args, auth_attempts=3):
+    """Convert the input of `args` to Lovelace UI and return an exit code."""
+    if args.format == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            _LOGGER.error("The msgpack package is required for msgpack "
+                          "output")
+            return 1
 
-    try:
-        from colorlog import ColoredFormatter
-        logging.getLogger().handlers[0].setFormatter(ColoredFormatter(
-            "%(log_color)s[%(levelname)s] %(message)s%(reset)s",
-            datefmt="",
-            reset=True,
-            log_colors={
-                'DEBUG': 'cyan',
-                'INFO': 'green',
-                'WARNING': 'yellow',
-                'ERROR': 'red',
-                'CRITICAL': 'red',
-            }
-        ))
-    except ImportError:
-        pass
+    # Only keep entity attributes that are used during conversion
+    attributes = Lovelace.state_attributes()
 
     # Detect input source (file, API URL, or - [stdin])
     if args.input == '-':
         # Input is stdin
         _LOGGER.debug("Reading input from stdin")
         if not sys.stdin.isatty():
-            states_json = json.load(sys.stdin)
+            states_json = list(iter_states(read_chunks(sys.stdin), attributes))
         else:
             _LOGGER.error("Cannot read input from stdin")
             return 1
@@ -774,19 +2183,34 @@ def main():
           args.input.lower().startswith('https://')):
         # Input is API URL
         _LOGGER.debug("Reading input from URL: {}".format(args.input))
-        hass = HomeAssistantAPI(args.input, args.password)
+        import requests
         try:
-            states_json = hass.get_states()
+            with HomeAssistantAPI(args.input, args.password,
+                                  auth_attempts=auth_attempts) as hass:
+                states_json = list(hass.iter_states(attributes))
         except requests.exceptions.ConnectionError:
             _LOGGER.error("Could not connect to API URL: "
                           "{}".format(args.input))
             return 1
+        except requests.exceptions.Timeout:
+            _LOGGER.error("Timed out reading from API URL: "
+                          "{}".format(args.input))
+            return 1
+        except requests.exceptions.HTTPError as exc:
+            status = exc.response.status_code
+            if status == requests.codes.unauthorized:
+                _LOGGER.error("Authentication failed for API URL: "
+                              "{}".format(args.input))
+            else:
+                _LOGGER.error("API URL returned HTTP status {}: {}"
+                              "".format(status, args.input))
+            return 1
     else:
         # Input is file
         _LOGGER.debug("Reading input from file: {}".format(args.input))
         try:
             with open(args.input, 'r') as f:
-                states_json = json.load(f)
+                states_json = list(iter_states(read_chunks(f), attributes))
         except FileNotFoundError:
             _LOGGER.error("{}: No such file".format(args.input))
             return 1
@@ -794,15 +2218,18 @@ def main():
             _LOGGER.error("{}: Permission denied".format(args.input))
             return 1
 
-    # Convert to Lovelace UI
-    lovelace = Lovelace(states_json, title=args.title)
-
-    # Get YAML dump of Lovelace UI
-    dump = lovelace.dump()
-
     # Set our output file
     outfile = args.output
 
+    # Skip conversion and output if nothing they depend on has changed
+    digest = states_digest(states_json, attributes, args.title)
+    if args.if_changed and read_digest(outfile) == digest:
+        _LOGGER.info("Lovelace UI is up to date: {}".format(outfile))
+        return 0
+
+    # Convert to Lovelace UI
+    lovelace = Lovelace(states_json, title=args.title)
+
     # Try to create a backup
     try:
         backupfile = backup_file(outfile, dry_run=args.dry_run)
@@ -817,13 +2244,19 @@ def main():
     if not args.dry_run:
         # Try to output to file
         try:
-            with open(outfile, 'w') as f:
-                f.write("""
+            if args.format == 'msgpack':
+                with open(outfile, 'wb') as f:
+                    lovelace.dump_to(f, args.format)
+            else:
+                with open(outfile, 'w') as f:
+                    if args.format == 'yaml':
+                        f.write("""
 # This file was automatically generated by lovelace_migrate.py
 # https://github.com/dale3h/python-lovelace
+{}{}
 
-""")
-                f.write(dump)
+""".format(DIGEST_COMMENT, digest))
+                    lovelace.dump_to(f, args.format)
 
             _LOGGER.info("Lovelace UI successfully written to: {}"
                          "".format(outfile))
@@ -833,12 +2266,164 @@ def main():
             return 1
 
     else:
-        # Output Lovelace YAML to stdout
-        print(lovelace.dump())
+        # Output Lovelace UI to stdout
+        if args.format == 'msgpack':
+            sys.stdout.flush()
+            lovelace.dump_to(sys.stdout.buffer, args.format)
+        else:
+            lovelace.dump_to(sys.stdout, args.format)
 
     # Return with a normal exit code
     return 0
 
 
+def load_manifest(filepath, defaults):
+    """
+    Load the batch jobs of a JSON manifest.
+
+    The manifest is a list of objects with an `input` (file, glob or API
+    URL) and an `output`, optionally overriding `title`, `format` and
+    `password`. `{name}` in an output is replaced by the input file name
+    without extension (or the API host), which is needed for globs.
+    Relative paths are relative to the manifest. Returns a list of
+    argument namespaces based on `defaults`.
+    """
+    with open(filepath, 'r') as f:
+        manifest = json.load(f)
+
+    root = os.path.dirname(os.path.abspath(filepath))
+    jobs = []
+
+    for entry in manifest:
+        source = entry['input']
+        if re.match(r'^https?://', source, re.I):
+            inputs = [source]
+        else:
+            pattern = os.path.join(root, source)
+            if re.search(r'[*?[]', source):
+                inputs = sorted(glob.glob(pattern))
+            else:
+                inputs = [pattern]
+
+        for path in inputs:
+            if re.match(r'^https?://', path, re.I):
+                name = re.sub(r'^https?://([^/:]+).*$', r'\1', path)
+            else:
+                name = os.path.splitext(os.path.basename(path))[0]
+
+            job = argparse.Namespace(**vars(defaults))
+            job.password = defaults.password or ''
+            for key in ('title', 'format', 'password'):
+                if key in entry:
+                    setattr(job, key, entry[key])
+            job.input = path
+            job.output = os.path.join(root, entry['output'].format(name=name))
+            jobs.append(job)
+
+    outputs = [job.output for job in jobs]
+    duplicates = sorted(set(o for o in outputs if outputs.count(o) > 1))
+    if duplicates:
+        raise ValueError("Duplicate outputs: {}".format(", ".join(duplicates)))
+
+    return jobs
+
+
+def run_job(args):
+    """Run one batch job and return its result."""
+    start = time.monotonic()
+    try:
+        # Batch jobs cannot prompt for passwords
+        code = migrate(args, auth_attempts=0)
+    except Exception as exc:  # pylint: disable=broad-except
+        _LOGGER.error("{}: {}".format(args.input, exc))
+        code = 1
+
+    return {
+        'input': args.input,
+        'output': args.output,
+        'code': code,
+        'seconds': time.monotonic() - start,
+    }
+
+
+def run_batch(args):
+    """Run the jobs of a batch manifest in worker processes."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    if args.password is None:
+        # `-p` without a password: prompt once here, as jobs cannot
+        try:
+            args.password = getpass("Enter password: ")
+        except KeyboardInterrupt:
+            print()
+            return 130
+
+    try:
+        jobs = load_manifest(args.batch, args)
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        _LOGGER.error("{}: Invalid manifest: {}".format(args.batch, exc))
+        return 1
+
+    for job in jobs:
+        if job.format not in Lovelace.DUMP_FORMATS:
+            _LOGGER.error("{}: Invalid format: {}".format(job.input,
+                                                          job.format))
+            return 1
+
+    # Workers are forked from this process where supported, so they share
+    # the already imported and compiled converter classes
+    start = time.monotonic()
+    workers = max(1, min(args.jobs or 1, len(jobs)))
+    with ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(run_job, jobs))
+
+    failed = [result for result in results if result['code']]
+    for result in results:
+        _LOGGER.debug("{input} -> {output}: exit code {code} "
+                      "({seconds:.2f} s)".format(**result))
+    for result in failed:
+        _LOGGER.error("Failed: {input}".format(**result))
+
+    _LOGGER.info("{} of {} jobs succeeded in {:.2f} s with {} workers"
+                 "".format(len(results) - len(failed), len(results),
+                           time.monotonic() - start, workers))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    """Main program function."""
+    args = parse_args(argv)
+
+    if args.debug:
+        log_level = logging.DEBUG
+    else:
+        log_level = logging.INFO
+    logging.basicConfig(level=log_level)
+
+    # Colored output is only useful on a terminal, so skip importing
+    # colorlog entirely when stderr is redirected (e.g. from cron)
+    if sys.stderr.isatty():
+        try:
+            from colorlog import ColoredFormatter
+            logging.getLogger().handlers[0].setFormatter(ColoredFormatter(
+                "%(log_color)s[%(levelname)s] %(message)s%(reset)s",
+                datefmt="",
+                reset=True,
+                log_colors={
+                    'DEBUG': 'cyan',
+                    'INFO': 'green',
+                    'WARNING': 'yellow',
+                    'ERROR': 'red',
+                    'CRITICAL': 'red',
+                }
+            ))
+        except ImportError:
+            pass
+
+    if args.batch is not None:
+        return run_batch(args)
+    return migrate(args)
+
+
 if __name__ == '__main__':
     sys.exit(main())
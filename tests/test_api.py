@@ -0,0 +1,179 @@
+"""Tests for the REST API client against a local stub server."""
+import asyncio
+import http.server
+import json
+import threading
+import unittest
+
+from unittest import mock
+
+import requests
+
+from lovelace_migrate import (
+    AsyncHomeAssistantAPI, HomeAssistantAPI, TTLCache, gather_states)
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a small JSON document (or states) per path, with an ETag."""
+
+    protocol_version = 'HTTP/1.1'
+    version = 1
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        etag = '"{}"'.format(StubHandler.version)
+        StubHandler.requests.append(
+            (self.path, self.headers.get('if-none-match'),
+             self.headers.get('x-ha-access')))
+
+        if self.headers.get('x-ha-access') == 'wrong':
+            self.send_response(401)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.headers.get('if-none-match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.path == '/api/states':
+            data = [{'entity_id': 'sensor.version', 'state': 'on',
+                     'attributes': {
+                         'friendly_name': str(StubHandler.version),
+                         'unit_of_measurement': ''}}]
+        else:
+            data = {'path': self.path, 'version': StubHandler.version}
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestHomeAssistantAPI(unittest.TestCase):
+    """Responses are cached, revalidated and bounded."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                     StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}/api'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.version = 1
+        StubHandler.requests = []
+
+    def test_cache(self):
+        with HomeAssistantAPI(self.url, 'secret') as api:
+            first = api.get_config()
+            self.assertIs(api.get_config(), first)
+        self.assertEqual(StubHandler.requests,
+                         [('/api/config', None, 'secret')])
+
+    def test_not_modified(self):
+        with HomeAssistantAPI(self.url, 'secret', cache_ttl=0) as api:
+            first = api.get_config()
+            self.assertIs(api.get_config(), first)
+
+            StubHandler.version = 2
+            changed = api.get_config()
+            self.assertIsNot(changed, first)
+            self.assertEqual(changed['version'], 2)
+
+        self.assertEqual([etag for path, etag, password
+                          in StubHandler.requests], [None, '"1"', '"1"'])
+
+    def test_iter_states(self):
+        attributes = frozenset(['friendly_name'])
+        with HomeAssistantAPI(self.url, 'secret') as api:
+            first = list(api.iter_states(attributes))
+            self.assertEqual(first, [{'entity_id': 'sensor.version',
+                                      'attributes': {'friendly_name': '1'}}])
+            self.assertEqual(list(api.iter_states(attributes)), first)
+            self.assertEqual(len(StubHandler.requests), 1)
+
+            # Revalidated once the cache is bypassed, for each projection
+            again = list(api.iter_states(attributes, refresh=True))
+            self.assertIs(again[0], first[0])
+            self.assertEqual(
+                len(list(api.iter_states(refresh=True))[0]['attributes']), 2)
+
+            StubHandler.version = 2
+            changed = list(api.iter_states(attributes, refresh=True))
+            self.assertEqual(changed[0]['attributes']['friendly_name'], '2')
+
+        self.assertEqual([etag for path, etag, password
+                          in StubHandler.requests], [None, '"1"', None, '"1"'])
+
+    def test_iter_states_partial(self):
+        """States read only partially are not cached."""
+        with HomeAssistantAPI(self.url, 'secret') as api:
+            for state in api.iter_states():
+                break
+            list(api.iter_states())
+        self.assertEqual([etag for path, etag, password
+                          in StubHandler.requests], [None, None])
+
+    def test_validators_bounded(self):
+        with HomeAssistantAPI(self.url, 'secret', cache_size=8) as api:
+            for i in range(50):
+                api.get('/endpoint/{}'.format(i))
+            self.assertEqual(len(api.cache), 8)
+            self.assertEqual(len(api.validators), 8)
+
+    @mock.patch('lovelace_migrate.getpass', side_effect=AssertionError)
+    def test_gather_states(self, getpass):
+        results = asyncio.run(gather_states([self.url, self.url], 'secret'))
+        self.assertEqual([r[0]['attributes']['friendly_name']
+                          for r in results], ['1'] * 2)
+
+        results = asyncio.run(gather_states([self.url, self.url], 'wrong'))
+        for result in results:
+            self.assertIsInstance(result, requests.exceptions.HTTPError)
+
+        results = asyncio.run(gather_states([self.url]))
+        self.assertEqual(StubHandler.requests[-1][2], '')
+        getpass.assert_not_called()
+
+    def test_async_password_required(self):
+        with self.assertRaises(ValueError):
+            AsyncHomeAssistantAPI(self.url, None)
+
+
+class TestTTLCache(unittest.TestCase):
+    """Entries are evicted by size and age."""
+
+    def test_lru(self):
+        cache = TTLCache(maxsize=2, ttl=None)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_ttl(self):
+        cache = TTLCache(maxsize=2, ttl=0)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Tests for batch mode."""
+import json
+import os
+import tempfile
+import unittest
+
+from lovelace_migrate import load_manifest, parse_args
+
+
+class TestBatch(unittest.TestCase):
+    """Batch jobs are built from the manifest and the command line."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.tmp.name, 'manifest.json')
+        os.mkdir(os.path.join(self.tmp.name, 'states'))
+        for name in ('a', 'b'):
+            path = os.path.join(self.tmp.name, 'states', name + '.json')
+            with open(path, 'w') as f:
+                json.dump([], f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_manifest(self, manifest):
+        with open(self.manifest, 'w') as f:
+            json.dump(manifest, f)
+
+    def test_password_option(self):
+        args = parse_args(['--batch', self.manifest, '-p', 'secret'])
+        self.assertIsNone(args.input)
+        self.assertEqual(args.password, 'secret')
+
+        self.write_manifest([
+            {'input': 'http://one:8123/api', 'output': '{name}.yaml'},
+            {'input': 'http://two:8123/api', 'output': '{name}.yaml',
+             'password': 'other'},
+        ])
+        jobs = load_manifest(self.manifest, args)
+        self.assertEqual([job.password for job in jobs], ['secret', 'other'])
+
+    def test_no_password(self):
+        args = parse_args(['--batch', self.manifest])
+        self.write_manifest([{'input': 'states/*.json',
+                              'output': 'ui/{name}.yaml'}])
+        jobs = load_manifest(self.manifest, args)
+
+        self.assertEqual([job.password for job in jobs], ['', ''])
+        self.assertEqual(
+            [(os.path.basename(job.input), job.output) for job in jobs],
+            [('a.json', os.path.join(self.tmp.name, 'ui/a.yaml')),
+             ('b.json', os.path.join(self.tmp.name, 'ui/b.yaml'))])
+
+    def test_duplicate_outputs(self):
+        args = parse_args(['--batch', self.manifest])
+        self.write_manifest([{'input': 'states/*.json', 'output': 'ui.yaml'}])
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest, args)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Tests for the command line interface."""
+import http.server
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+from lovelace_migrate import HomeAssistantAPI, migrate, parse_args
+
+
+class ErrorHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every request with `status`."""
+
+    protocol_version = 'HTTP/1.1'
+    status = 401
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(ErrorHandler.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestMigrate(unittest.TestCase):
+    """API errors end the run with an error instead of a traceback."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                     ErrorHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}/api'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    @mock.patch('lovelace_migrate.getpass', return_value='bad')
+    def test_authentication_failed(self, getpass):
+        ErrorHandler.status = 401
+        args = parse_args([self.url, '-p', 'bad', '--dry-run'])
+        with self.assertLogs('lovelace_migrate', 'ERROR') as logs:
+            self.assertEqual(migrate(args), 1)
+        self.assertEqual(getpass.call_count, 3)
+        self.assertIn('Authentication failed', logs.output[-1])
+
+    @mock.patch.object(HomeAssistantAPI, 'wait')
+    def test_retries_exhausted(self, wait):
+        ErrorHandler.status = 503
+        args = parse_args([self.url, '-p', 'secret', '--dry-run'])
+        with self.assertLogs('lovelace_migrate', 'ERROR') as logs:
+            self.assertEqual(migrate(args), 1)
+        self.assertEqual(wait.call_count, 3)
+        self.assertIn('HTTP status 503', logs.output[-1])
+
+
+# Imports that cold starts on local files must not pay for
+HEAVY_MODULES = ('requests', 'yaml', 'colorlog')
+
+STARTUP = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import lovelace_migrate
+seconds = time.perf_counter() - start
+with contextlib.redirect_stdout(io.StringIO()):
+    code = lovelace_migrate.main(sys.argv[1:])
+print(json.dumps({'seconds': seconds, 'code': code,
+                  'modules': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+class TestStartup(unittest.TestCase):
+    """Converting a local file does not import the heavy dependencies."""
+
+    # Generous, to stay reliable on slow machines; the import itself takes
+    # a few tens of milliseconds
+    IMPORT_BUDGET = 0.5
+
+    def run_startup(self, *argv):
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP] + list(argv),
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return json.loads(result.stdout.decode())
+
+    def test_local_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'states.json')
+            with open(path, 'w') as f:
+                json.dump([{'entity_id': 'camera.door', 'state': 'idle',
+                            'attributes': {}}], f)
+
+            for fmt in ('yaml', 'json'):
+                with self.subTest(fmt=fmt):
+                    result = self.run_startup('--dry-run', '-f', fmt, path)
+                    self.assertEqual(result['code'], 0)
+                    self.assertEqual(result['modules'], [])
+                    self.assertLess(result['seconds'], self.IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Tests for the conversion cache and states ingest."""
+import unittest
+
+from copy import deepcopy
+from unittest import mock
+
+from lovelace_migrate import Lovelace
+
+
+def group(object_id, members, **attributes):
+    """Return the state of a group."""
+    attributes['entity_id'] = members
+    return {'entity_id': 'group.' + object_id, 'state': 'on',
+            'attributes': attributes}
+
+
+STATES = [
+    {'entity_id': 'light.kitchen', 'state': 'on',
+     'attributes': {'friendly_name': 'Kitchen', 'brightness': 255}},
+    {'entity_id': 'light.hall', 'state': 'off', 'attributes': {}},
+    {'entity_id': 'camera.door', 'state': 'idle', 'attributes': {}},
+    group('shared', ['light.kitchen', 'light.hall']),
+    group('outer', ['group.shared', 'camera.door'], friendly_name='Outer'),
+    group('first', ['group.shared'], view=True),
+    group('second', ['group.shared', 'light.hall'], view=True),
+    group('third', ['group.outer'], view=True),
+]
+
+
+def shared_cards(lovelace):
+    """Return the cards of `group.shared` in the views that contain it."""
+    return [view['cards'][-1] for view in lovelace['views']
+            if view['title'] in ('First', 'Second')]
+
+
+class TestConversionCache(unittest.TestCase):
+    """Groups referenced from several places are converted once."""
+
+    def test_converted_once(self):
+        card, fx = Lovelace.CARD_CONVERTERS['group']
+        converted = []
+
+        def from_group_config(config):
+            converted.append(config['entity_id'])
+            return fx(config)
+
+        with mock.patch.dict(Lovelace.CARD_CONVERTERS,
+                             {'group': (card, from_group_config)}):
+            Lovelace(STATES)
+        self.assertEqual(sorted(converted), ['group.outer', 'group.shared'])
+
+    def test_share(self):
+        first, second = shared_cards(Lovelace(STATES))
+        self.assertIs(first, second)
+
+    def test_copy(self):
+        first, second = shared_cards(Lovelace(STATES, share=False))
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        self.assertIsNot(first['entities'], second['entities'])
+
+        first['entities'].append('light.extra')
+        self.assertNotIn('light.extra', second['entities'])
+
+    def test_same_output(self):
+        self.assertEqual(Lovelace(STATES, share=False).dump(),
+                         Lovelace(STATES).dump())
+
+
+class TestIngest(unittest.TestCase):
+    """The states JSON of the caller is left as it was."""
+
+    def test_not_modified(self):
+        states = deepcopy(STATES)
+        for kwargs in ({}, {'share': False}, {'compact': True}):
+            with self.subTest(**kwargs):
+                Lovelace(states, **kwargs).dump()
+                self.assertEqual(states, STATES)
+
+    def test_dropped_members(self):
+        """Members dropped by the group checks stay in the states JSON."""
+        states = deepcopy(STATES)
+        with self.assertLogs('lovelace_migrate', 'ERROR'):
+            Lovelace(states, max_depth=1).dump()
+        self.assertEqual(states, STATES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Tests for converter registration."""
+import unittest
+
+from lovelace_migrate import Lovelace, reads
+
+
+STATES = [
+    {'entity_id': 'light.kitchen', 'state': 'on',
+     'attributes': {'friendly_name': 'Kitchen'}},
+    {'entity_id': 'group.default_view', 'state': 'on',
+     'attributes': {'entity_id': ['light.kitchen'], 'view': True}},
+]
+
+
+class TestRegisterCard(unittest.TestCase):
+    """Cards registered for a domain are used by `Card.from_config`."""
+
+    def setUp(self):
+        self.card_domains = dict(Lovelace.CARD_DOMAINS)
+        self.card_converters = dict(Lovelace.CARD_CONVERTERS)
+        self.converters = dict(Lovelace.GlanceCard.converters)
+
+    def tearDown(self):
+        Lovelace.CARD_DOMAINS = self.card_domains
+        Lovelace.CARD_CONVERTERS = self.card_converters
+        Lovelace.GlanceCard.converters = self.converters
+
+    def test_plain_function(self):
+        def from_light(config):
+            return Lovelace.GlanceCard(entities=[config['entity_id']])
+
+        Lovelace.GlanceCard.register_converter('light', from_light)
+        Lovelace.register_card('light', Lovelace.GlanceCard)
+
+        card = Lovelace.Card.from_config(
+            Lovelace(STATES)._states['light']['kitchen'])
+        self.assertIsInstance(card, Lovelace.GlanceCard)
+        self.assertEqual(card['entities'], ['light.kitchen'])
+        self.assertIn('type: glance', Lovelace(STATES).dump())
+        self.assertIsNone(Lovelace.state_attributes())
+
+    def test_declared_attributes(self):
+        @reads('friendly_name')
+        def from_light(config):
+            return Lovelace.GlanceCard(
+                title=config['attributes']['friendly_name'])
+
+        Lovelace.GlanceCard.register_converter('light', from_light)
+        Lovelace.register_card('light', Lovelace.GlanceCard)
+
+        self.assertIn('friendly_name', Lovelace.state_attributes())
+        self.assertIn('title: Kitchen', Lovelace(STATES).dump())
+
+    def test_unsupported_domain(self):
+        with self.assertRaises(ValueError):
+            Lovelace.register_card('light', Lovelace.MapCard)
+
+
+if __name__ == '__main__':
+    unittest.main()
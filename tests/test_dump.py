@@ -0,0 +1,48 @@
+"""Tests for dumping a Lovelace UI."""
+import io
+import json
+import unittest
+
+from lovelace_migrate import Lovelace
+
+
+STATES = [
+    {'entity_id': 'light.kitchen', 'state': 'on',
+     'attributes': {'friendly_name': 'Kitchen'}},
+    {'entity_id': 'group.kitchen', 'state': 'on',
+     'attributes': {'entity_id': ['light.kitchen']}},
+    {'entity_id': 'group.default_view', 'state': 'on',
+     'attributes': {'entity_id': ['group.kitchen'], 'view': True}},
+]
+
+
+class TestDump(unittest.TestCase):
+    """Dumps always reflect the current tree."""
+
+    def test_mutated_list(self):
+        lovelace = Lovelace(STATES)
+        self.assertNotIn('light.x', lovelace.dump())
+
+        lovelace['views'][0]['cards'][0]['entities'].append('light.x')
+        self.assertIn('- light.x', lovelace.dump())
+        self.assertEqual(lovelace.dump(), lovelace.dump(pyyaml=True))
+
+    def test_mutated_object(self):
+        lovelace = Lovelace(STATES)
+        lovelace.dump()
+        lovelace['views'][0]['title'] = 'Changed'
+        self.assertIn('title: Changed', lovelace.dump())
+
+    def test_dump_to(self):
+        lovelace = Lovelace(STATES)
+        for fmt in ('yaml', 'json'):
+            stream = io.StringIO()
+            lovelace.dump_to(stream, fmt)
+            self.assertEqual(stream.getvalue().strip(), lovelace.dump(fmt))
+
+        self.assertEqual(list(json.loads(lovelace.dump('json'))),
+                         list(lovelace))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Tests for group cycle and depth checks."""
+import sys
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+
+from lovelace_migrate import Lovelace
+
+
+def group(object_id, members, **attributes):
+    """Return the state of a group."""
+    attributes['entity_id'] = members
+    return {'entity_id': 'group.' + object_id, 'state': 'on',
+            'attributes': attributes}
+
+
+def light(object_id):
+    """Return the state of a light."""
+    return {'entity_id': 'light.' + object_id, 'state': 'on',
+            'attributes': {}}
+
+
+def chain(count):
+    """Return `count` groups, each containing the next one and a light."""
+    return [group('g{}'.format(i), ['light.l{}'.format(i),
+                                    'group.g{}'.format(i + 1)])
+            for i in range(count - 1)] + [
+        group('g{}'.format(count - 1), ['light.l{}'.format(count - 1)])] + [
+        light('l{}'.format(i)) for i in range(count)]
+
+
+CYCLES = [
+    light('kitchen'),
+    group('a', ['group.b', 'light.kitchen']),
+    group('b', ['group.c']),
+    group('c', ['group.a', 'group.c', 'light.kitchen']),
+]
+
+
+class TestCheckGroups(unittest.TestCase):
+    """Offending member references are reported and dropped."""
+
+    def check_groups(self, states_json, max_depth=Lovelace.MAX_GROUP_DEPTH):
+        with self.assertLogs('lovelace_migrate', 'ERROR'):
+            lovelace = Lovelace([])
+            states = lovelace.build_states(states_json)
+            return states, lovelace.check_groups(states, max_depth)
+
+    def test_self_loop(self):
+        states, problems = self.check_groups(
+            [light('kitchen'), group('c', ['group.c', 'light.kitchen'])])
+        self.assertEqual(problems, [['group.c', 'group.c']])
+        self.assertEqual(list(states['group']['c']['entities']),
+                         ['light.kitchen'])
+
+    def test_cycle(self):
+        states, problems = self.check_groups(CYCLES)
+        self.assertEqual(problems, [
+            ['group.a', 'group.b', 'group.c', 'group.a'],
+            ['group.c', 'group.c'],
+        ])
+        self.assertEqual(list(states['group']['c']['entities']),
+                         ['light.kitchen'])
+
+    def test_max_depth(self):
+        states, problems = self.check_groups(chain(6), max_depth=3)
+        self.assertEqual(problems, [['group.g0', 'group.g1', 'group.g2',
+                                     'group.g3']])
+        self.assertNotIn('group.g3', states['group']['g2']['entities'])
+
+    def test_deep_chain(self):
+        """Chains deeper than the recursion limit convert."""
+        count = sys.getrecursionlimit() + 100
+        with self.assertLogs('lovelace_migrate', 'ERROR') as logs:
+            lovelace = Lovelace([group('default_view', ['group.g0'],
+                                       view=True)] + chain(count))
+        self.assertIn("ignoring 'group.g31' in 'group.g30'", logs.output[0])
+
+        self.assertEqual(list(lovelace._states['group']['g30']['entities']),
+                         ['light.l30'])
+        lines = [line.strip() for line in lovelace.dump().splitlines()]
+        self.assertIn('- light.l30', lines)
+        self.assertNotIn('- light.l31', lines)
+
+
+class TestExecutor(unittest.TestCase):
+    """Workers replay the dropped references and give the same output."""
+
+    def test_same_output(self):
+        states = CYCLES + chain(6) + [
+            group('first', ['group.a', 'light.kitchen'], view=True),
+            group('second', ['group.b', 'group.g0'], view=True),
+            group('third', ['group.c', 'group.g1'], view=True),
+        ]
+
+        with self.assertLogs('lovelace_migrate', 'ERROR'):
+            serial = Lovelace(states, max_depth=4)
+        with ProcessPoolExecutor(2) as executor:
+            with self.assertLogs('lovelace_migrate', 'ERROR'):
+                parallel = Lovelace(states, max_depth=4, executor=executor)
+
+        # The domain cards view, then the three group views
+        self.assertEqual(len(serial['views']), 4)
+        self.assertEqual(parallel.dump(), serial.dump())
+
+
+if __name__ == '__main__':
+    unittest.main()
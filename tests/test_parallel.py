@@ -0,0 +1,118 @@
+"""Tests for parallel conversion and serialization."""
+import io
+import multiprocessing
+import pickle
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+
+from lovelace_migrate import Lovelace, write_yaml
+
+
+class MonsterCard(Lovelace.CustomCard):
+    """Custom card with a converter, as registered by users."""
+
+    @classmethod
+    def from_sensor_config(cls, config):
+        """Convert a sensor to a monster card."""
+        return cls('monster-card', card={'type': 'glance'},
+                   filter={'include': [{'entity_id': config['entity_id']}]})
+
+
+def from_camera_config(config):
+    """Convert a camera to a monster card, registered as a plain function."""
+    return MonsterCard('monster-card', card={'type': 'picture-entity',
+                                             'entity': config['entity_id']})
+
+
+def group(object_id, members, **attributes):
+    """Return the state of a group."""
+    attributes['entity_id'] = members
+    return {'entity_id': 'group.' + object_id, 'state': 'on',
+            'attributes': attributes}
+
+
+STATES = [
+    {'entity_id': 'sensor.temperature', 'state': '21',
+     'attributes': {'friendly_name': 'Temperature'}},
+    {'entity_id': 'camera.door', 'state': 'idle', 'attributes': {}},
+    group('climate', ['sensor.temperature']),
+    group('first', ['group.climate', 'camera.door'], view=True),
+    group('second', ['group.climate', 'sensor.temperature'], view=True),
+    group('third', ['camera.door', 'sensor.temperature'], view=True),
+]
+
+
+class TestParallel(unittest.TestCase):
+    """Parallel paths must give the same output as the serial ones."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def setUp(self):
+        self.card_domains = dict(Lovelace.CARD_DOMAINS)
+        self.card_converters = dict(Lovelace.CARD_CONVERTERS)
+        self.custom_cards = dict(Lovelace.CUSTOM_CARDS)
+        self.converters = dict(MonsterCard.converters)
+        Lovelace.register_card('sensor', MonsterCard)
+
+    def tearDown(self):
+        Lovelace.CARD_DOMAINS = self.card_domains
+        Lovelace.CARD_CONVERTERS = self.card_converters
+        Lovelace.CUSTOM_CARDS = self.custom_cards
+        MonsterCard.converters = self.converters
+
+    def test_pickle_custom_card(self):
+        card = Lovelace.CustomCard('monster-card', card={'type': 'glance'},
+                                   filter={}, when={})
+        copy = pickle.loads(pickle.dumps(card))
+        self.assertIs(type(copy), Lovelace.CustomCard)
+        self.assertEqual(list(copy.items()), list(card.items()))
+        self.assertEqual(copy.resource, card.resource)
+        self.assertEqual(copy.key_order, card.key_order)
+
+    def test_convert_views(self):
+        serial = Lovelace(STATES)
+        parallel = Lovelace(STATES, executor=self.executor)
+        self.assertIn('custom:monster-card', serial.dump())
+        self.assertEqual(parallel.dump(), serial.dump())
+
+    def test_spawn(self):
+        """Workers that do not inherit runtime registrations get them."""
+        MonsterCard.register_converter('camera', from_camera_config)
+        Lovelace.register_card('camera', MonsterCard)
+        Lovelace.CUSTOM_CARDS['monster-card'] = dict(
+            self.custom_cards['monster-card'], resource='/local/monster.js')
+
+        serial = Lovelace(STATES).dump()
+        self.assertEqual(serial.count('custom:monster-card'), 9)
+        self.assertIn('picture-entity', serial)
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(2, mp_context=context) as executor:
+            parallel = Lovelace(STATES, executor=executor)
+        self.assertEqual(parallel.dump(), serial)
+        self.assertEqual(
+            parallel['views'][1]['cards'][0].resource, '/local/monster.js')
+
+    def test_dump_views(self):
+        lovelace = Lovelace(STATES)
+        view = Lovelace.View(title='Custom')
+        view.add_card(Lovelace.CustomCard('monster-card',
+                                          card={'type': 'glance'}))
+        lovelace.add_view(view)
+
+        serial, parallel = io.StringIO(), io.StringIO()
+        write_yaml(lovelace, serial)
+        write_yaml(lovelace, parallel, self.executor)
+        self.assertIn('custom:monster-card', serial.getvalue())
+        self.assertEqual(parallel.getvalue(), serial.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
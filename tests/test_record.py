@@ -0,0 +1,54 @@
+"""Tests for compact Lovelace records."""
+import unittest
+
+from lovelace_migrate import Lovelace, LovelaceRecord
+
+
+class TestLovelaceRecord(unittest.TestCase):
+    """Records behave like read-only mappings."""
+
+    def setUp(self):
+        card = Lovelace.EntitiesCard(title='Kitchen',
+                                     entities=['light.kitchen'])
+        self.card = card
+        self.record = card.compact()
+
+    def test_mapping(self):
+        self.assertIsInstance(self.record, LovelaceRecord)
+        self.assertEqual(list(self.record), list(self.card))
+        self.assertEqual(self.record['title'], 'Kitchen')
+        self.assertEqual(dict(self.record), dict(self.card))
+        with self.assertRaises(KeyError):
+            self.record['missing']
+
+    def test_items(self):
+        items = self.record.items()
+        self.assertEqual(len(items), len(self.card))
+        self.assertEqual(list(items), list(self.card.items()))
+        self.assertEqual(list(items), list(self.card.items()))
+        self.assertIn(('title', 'Kitchen'), items)
+        self.assertNotIn(('title', 'Other'), items)
+
+    def test_shared_keys(self):
+        other = Lovelace.EntitiesCard(title='Hall', entities=[]).compact()
+        self.assertIs(other._keys, self.record._keys)
+
+    def test_equal(self):
+        view = Lovelace.View(title='Home')
+        view.add_card(self.card)
+        self.assertEqual(view.compact(), view)
+
+    def test_dump(self):
+        states = [
+            {'entity_id': 'light.kitchen', 'state': 'on', 'attributes': {}},
+            {'entity_id': 'group.kitchen', 'state': 'on',
+             'attributes': {'entity_id': ['light.kitchen'], 'view': True}},
+        ]
+        lovelace = Lovelace(states, compact=True)
+        self.assertIsInstance(lovelace['views'][0], LovelaceRecord)
+        self.assertEqual(lovelace.dump(), Lovelace(states).dump())
+        self.assertEqual(lovelace.dump('json'), Lovelace(states).dump('json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
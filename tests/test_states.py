@@ -0,0 +1,71 @@
+"""Tests for streaming states JSON input."""
+import json
+import unittest
+
+from lovelace_migrate import iter_states, project_state, states_digest
+
+
+STATES = [
+    {'entity_id': 'light.kitchen', 'state': 'on',
+     'attributes': {'friendly_name': 'Kitchen', 'brightness': 255}},
+    {'entity_id': 'group.all', 'state': 'on',
+     'attributes': {'entity_id': ['light.kitchen'], 'note': '[1, {2}]'}},
+]
+
+
+def chunked(text, size):
+    """Split `text` into chunks of `size` characters."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestIterStates(unittest.TestCase):
+    """Valid states JSON is parsed in any chunking, invalid JSON is not."""
+
+    def test_chunks(self):
+        text = ' ' + json.dumps(STATES, indent=2) + '\n'
+        for size in range(1, len(text) + 1):
+            self.assertEqual(list(iter_states(chunked(text, size))), STATES)
+
+    def test_empty(self):
+        self.assertEqual(list(iter_states(['[', ' ]'])), [])
+
+    def test_attributes(self):
+        attributes = frozenset(['friendly_name'])
+        self.assertEqual(
+            list(iter_states([json.dumps(STATES)], attributes)),
+            [project_state(s, attributes) for s in STATES])
+
+    def test_invalid(self):
+        state = json.dumps(STATES[0])
+        for text in ['{}',
+                     '[' + state + ' ' + state + ']',
+                     '[,' + state + ']',
+                     '[' + state + ',,' + state + ']',
+                     '[' + state + ',]',
+                     '[' + state + '] extra',
+                     '[' + state,
+                     '[12, 34]',
+                     '["light.kitchen"]']:
+            for size in (1, 7, len(text)):
+                with self.subTest(text=text, size=size):
+                    with self.assertRaises(ValueError):
+                        list(iter_states(chunked(text, size)))
+
+    def test_split_scalar(self):
+        with self.assertRaises(ValueError):
+            list(iter_states(['[12', '34]']))
+
+
+class TestStatesDigest(unittest.TestCase):
+    """The digest only changes with what the conversion uses."""
+
+    def test_digest(self):
+        digest = states_digest(STATES, None, 'Home')
+        changed = [dict(STATES[0], state='off')] + STATES[1:]
+        self.assertEqual(states_digest(changed, None, 'Home'), digest)
+        self.assertNotEqual(states_digest(STATES, None, 'Other'), digest)
+        self.assertNotEqual(states_digest(STATES[::-1], None, 'Home'), digest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""Tests for the WebSocket states source against a fake server."""
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+import unittest
+
+from lovelace_migrate import HomeAssistantWebSocket, project_state
+
+try:
+    import websocket  # noqa: F401
+except ImportError:
+    websocket = None
+
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+STATES = [
+    {'entity_id': 'light.kitchen', 'state': 'on',
+     'attributes': {'friendly_name': 'Kitchen', 'brightness': 255}},
+    {'entity_id': 'sensor.temperature', 'state': '21',
+     'attributes': {'friendly_name': 'Temperature'}},
+]
+
+
+class FakeServer(object):
+    """Minimal Home Assistant WebSocket API server for one connection."""
+
+    def __init__(self, password='secret'):
+        self.password = password
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.url = 'http://127.0.0.1:{}/api'.format(
+            self.listener.getsockname()[1])
+        self.conn = None
+        self.subscription = None
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.listener.close()
+        if self.conn is not None:
+            self.conn.close()
+
+    def serve(self):
+        self.conn, _ = self.listener.accept()
+        self.handshake()
+        self.send({'type': 'auth_required'})
+        if self.receive().get('api_password') != self.password:
+            self.send({'type': 'auth_invalid', 'message': 'Invalid password'})
+            return
+        self.send({'type': 'auth_ok'})
+
+        while True:
+            try:
+                message = self.receive()
+            except (OSError, ValueError):
+                return
+            if message['type'] == 'subscribe_events':
+                self.subscription = message['id']
+                result = None
+            else:
+                result = STATES
+            self.send({'id': message['id'], 'type': 'result',
+                       'success': True, 'result': result})
+            if message['type'] == 'get_states':
+                self.ready.set()
+
+    def handshake(self):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += self.conn.recv(4096)
+        key = [line.split(b':', 1)[1].strip()
+               for line in request.split(b'\r\n')
+               if line.lower().startswith(b'sec-websocket-key:')][0]
+        accept = base64.b64encode(
+            hashlib.sha1(key + GUID.encode()).digest())
+        self.conn.sendall(b'HTTP/1.1 101 Switching Protocols\r\n'
+                          b'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                          b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+    def read(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.conn.recv(size - len(data))
+            if not chunk:
+                raise ValueError("Connection closed")
+            data += chunk
+        return data
+
+    def receive(self):
+        header = self.read(2)
+        size = header[1] & 0x7f
+        if size == 126:
+            size = struct.unpack('>H', self.read(2))[0]
+        elif size == 127:
+            size = struct.unpack('>Q', self.read(8))[0]
+        mask = self.read(4)
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(self.read(size)))
+        if header[0] & 0x0f == 0x8:
+            # Answer the close handshake
+            with self.lock:
+                self.conn.sendall(struct.pack('>BB', 0x88, len(data)) + data)
+            raise ValueError("Connection closed")
+        return json.loads(data.decode())
+
+    def send(self, message):
+        data = json.dumps(message).encode()
+        if len(data) < 126:
+            header = struct.pack('>BB', 0x81, len(data))
+        elif len(data) < 65536:
+            header = struct.pack('>BBH', 0x81, 126, len(data))
+        else:
+            header = struct.pack('>BBQ', 0x81, 127, len(data))
+        with self.lock:
+            self.conn.sendall(header + data)
+
+    def state_changed(self, entity_id, new_state):
+        self.send({'id': self.subscription, 'type': 'event', 'event': {
+            'event_type': 'state_changed',
+            'data': {'entity_id': entity_id, 'new_state': new_state}}})
+
+
+@unittest.skipIf(websocket is None, "websocket-client is not installed")
+class TestHomeAssistantWebSocket(unittest.TestCase):
+    """States are loaded once and then kept current from events."""
+
+    attributes = frozenset(['friendly_name'])
+
+    def setUp(self):
+        self.server = FakeServer()
+        self.hass = HomeAssistantWebSocket(self.server.url, 'secret',
+                                           self.attributes, timeout=5)
+        self.hass.connect()
+        self.server.ready.wait(5)
+
+    def tearDown(self):
+        self.hass.close()
+        self.server.close()
+
+    def test_get_states(self):
+        self.assertEqual(self.hass.get_states(),
+                         [project_state(s, self.attributes) for s in STATES])
+        self.assertEqual(self.hass.version, 1)
+
+    def test_update_drains_pending_events(self):
+        for i in range(100):
+            self.server.state_changed('light.l{}'.format(i), {
+                'entity_id': 'light.l{}'.format(i), 'state': 'on',
+                'attributes': {'friendly_name': 'L{}'.format(i)}})
+        # Let all events arrive before polling without waiting
+        time.sleep(0.2)
+
+        self.assertTrue(self.hass.update())
+        self.assertEqual(len(self.hass.states), len(STATES) + 100)
+        self.assertFalse(self.hass.update())
+
+    def test_update_waits_for_event(self):
+        state = dict(STATES[1], attributes={'friendly_name': 'Outside'})
+        timer = threading.Timer(0.1, self.server.state_changed,
+                                ('sensor.temperature', state))
+        timer.start()
+
+        self.assertTrue(self.hass.update(timeout=5))
+        self.assertEqual(
+            self.hass.states['sensor.temperature']['attributes'],
+            {'friendly_name': 'Outside'})
+
+    def test_irrelevant_and_removed(self):
+        state = dict(STATES[0], state='off', last_changed='now')
+        self.server.state_changed('light.kitchen', state)
+        self.assertFalse(self.hass.update(timeout=0.5))
+
+        self.server.state_changed('light.kitchen', None)
+        self.assertTrue(self.hass.update(timeout=5))
+        self.assertNotIn('light.kitchen', self.hass.states)
+
+
+@unittest.skipIf(websocket is None, "websocket-client is not installed")
+class TestAuthentication(unittest.TestCase):
+    """A rejected password raises."""
+
+    def test_invalid_password(self):
+        server = FakeServer()
+        hass = HomeAssistantWebSocket(server.url, 'wrong', timeout=5)
+        try:
+            with self.assertRaises(RuntimeError):
+                hass.connect()
+        finally:
+            hass.close()
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Tests for the YAML writer against PyYAML."""
+import io
+import json
+import random
+import unittest
+
+from collections import OrderedDict
+
+import yaml
+
+from lovelace_migrate import Lovelace, ordered_dump, safe_dumper, write_yaml
+
+
+ALPHABET = list("abcXYZ019 -_:#,'\"[]{}&*!|>%@`?.~=<+\t/\\") + [
+    '\xe9', '\xa0', '\U0001f600', '\x7f', '\x00']
+
+# Strings PyYAML would resolve to other types or that need quoting
+WORDS = ['yes', 'No', 'ON', 'null', '~', '', '1', '0x1F', '1.5', '.inf',
+         '-.5', '1e5', '1_000', '2018-01-01', '2018-07-23 10:00:00',
+         '2018-07-23T10:00:00Z', '2018-7-3 1:00:00.5 +02:00', '12:30',
+         '<<', '=', '---', '...', '- a', 'a:', 'a: b', 'a #b', 'a#b', '-a',
+         ':a', '?', '? a', ' x', 'x ', 'Group 3', 'light.a']
+
+SCALARS = [True, False, None, 0, -3, 12345, 1.5, 1e20, float('inf'),
+           -float('inf'), 0.1]
+
+
+class RandomTree(object):
+    """Random Lovelace-like trees of ordered mappings, lists and scalars."""
+
+    def __init__(self, seed, alphabet=ALPHABET, max_length=12):
+        self.random = random.Random(seed)
+        self.alphabet = alphabet
+        self.max_length = max_length
+
+    def string(self):
+        if self.random.random() < .4:
+            return self.random.choice(WORDS)
+        return ''.join(self.random.choice(self.alphabet) for _ in
+                       range(self.random.randint(1, self.max_length)))
+
+    def node(self, depth):
+        r = self.random.random()
+        if depth > 4 or r < .4:
+            if self.random.random() < .6:
+                return self.string()
+            return self.random.choice(SCALARS)
+        if r < .7:
+            return OrderedDict(
+                (self.random.choice(['type', 'title', 'a b', 'x-y', '1']),
+                 self.node(depth + 1))
+                for _ in range(self.random.randint(0, 4)))
+        return [self.node(depth + 1)
+                for _ in range(self.random.randint(0, 4))]
+
+    def document(self):
+        return OrderedDict([('title', self.node(1)),
+                            ('views', [self.node(1), self.node(2)])])
+
+
+def dump(data):
+    """Dump `data` with `write_yaml`."""
+    stream = io.StringIO()
+    write_yaml(data, stream)
+    return stream.getvalue()
+
+
+def pyyaml_dump(data, Dumper=yaml.SafeDumper):
+    """Dump `data` through PyYAML the way `Lovelace.dump` can."""
+    return ordered_dump(data, Dumper=Dumper, default_flow_style=False)
+
+
+def states(count):
+    """Return states JSON for `count` entities in a few views."""
+    result = []
+    for i in range(count):
+        result.append({'entity_id': 'light.light_{}'.format(i),
+                       'state': 'on', 'attributes': {}})
+    for view in range(3):
+        members = ['light.light_{}'.format(i)
+                   for i in range(view, count, 3)]
+        result.append({'entity_id': 'group.room_{}'.format(view),
+                       'state': 'on',
+                       'attributes': {'entity_id': members,
+                                      'friendly_name': "Room: {}'s".format(
+                                          view)}})
+        result.append({'entity_id': 'group.view_{}'.format(view),
+                       'state': 'on',
+                       'attributes': {'entity_id': [
+                           'group.room_{}'.format(view)], 'view': True,
+                           'icon': 'mdi:home'}})
+    return result
+
+
+class TestWriteYaml(unittest.TestCase):
+    """`write_yaml` agrees with PyYAML."""
+
+    def test_round_trip(self):
+        """Any tree loads back as the same data, in the same order."""
+        trees = RandomTree(1, ALPHABET + ['\n', '\r', '\x85', ' '], 200)
+        for _ in range(2000):
+            data = trees.document()
+            with self.subTest(data=data):
+                self.assertEqual(
+                    json.dumps(yaml.safe_load(dump(data))), json.dumps(data))
+
+    def test_same_bytes(self):
+        """Short single-line strings are written exactly like PyYAML."""
+        trees = RandomTree(2)
+        for _ in range(2000):
+            data = trees.document()
+            with self.subTest(data=data):
+                self.assertEqual(dump(data), pyyaml_dump(data))
+
+    def test_lovelace(self):
+        lovelace = Lovelace(states(60))
+        self.assertEqual(lovelace.dump(), lovelace.dump(pyyaml=True))
+
+
+class TestSafeDumper(unittest.TestCase):
+    """The dumper picked by `safe_dumper` keeps the pure-Python output."""
+
+    def test_same_bytes(self):
+        lovelace = Lovelace(states(60))
+        self.assertEqual(pyyaml_dump(lovelace, safe_dumper()),
+                         pyyaml_dump(lovelace))
+
+        trees = RandomTree(3)
+        for _ in range(200):
+            data = trees.document()
+            with self.subTest(data=data):
+                self.assertEqual(pyyaml_dump(data, safe_dumper()),
+                                 pyyaml_dump(data))
+
+    @unittest.skipUnless(hasattr(yaml, 'CSafeDumper'), "libyaml is missing")
+    def test_probe(self):
+        """libyaml is only used if it dumps Lovelace configs identically."""
+        lovelace = Lovelace(states(60))
+        if pyyaml_dump(lovelace, yaml.CSafeDumper) != pyyaml_dump(lovelace):
+            self.assertIs(safe_dumper(), yaml.SafeDumper)
+        else:
+            self.assertIs(safe_dumper(), yaml.CSafeDumper)
+
+
+if __name__ == '__main__':
+    unittest.main()